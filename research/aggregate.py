@@ -0,0 +1,252 @@
+"""
+Single-pass grouped aggregates over decoded FlashLoan event tables.
+
+An Aggregator keeps count, min, max, sum and Welford mean / M2 (for the
+variance) of the loan amount, and of gas used where it is known, per group.
+It is fed a page (table) at a time: each page is reduced per group with
+NumPy and merged into the running state with Chan's parallel update, so no
+per-event values are kept. The state is JSON-serializable and mergeable,
+for checkpoints and for combining shards.
+
+Groups come from key functions table -> (codes, labels). The built-in ones
+are "token", "class" (stablecoin / eur_stablecoin / eth / btc / other), "size" (the loan-size
+buckets of BALANCER_COMPARISON.md) and "window:<blocks>" (block windows).
+Any callable with that signature works too; several keys group by their
+combination.
+
+Requires: pip install numpy pyarrow
+"""
+from __future__ import annotations
+import math
+from typing import Callable
+
+import numpy as np
+import pyarrow as pa
+
+from tokens import CLASS_NAMES, OTHER, REGISTRY
+
+# Loan-size buckets (token units, i.e. dollars for stablecoins): bucket i holds
+# SIZE_EDGES[i-1] <= amount < SIZE_EDGES[i].
+SIZE_EDGES = np.array([1e3, 1e4, 1e5, 1e6, 1e7, 1e8])
+SIZE_LABELS = ["$0 - $1K", "$1K - $10K", "$10K - $100K", "$100K - $1M",
+               "$1M - $10M", "$10M - $100M", "$100M+"]
+
+
+def token_key(table: pa.Table) -> tuple[np.ndarray, list]:
+    token = table.column("token").combine_chunks()
+    return token.indices.to_numpy(zero_copy_only=False), token.dictionary.to_pylist()
+
+
+def class_key(table: pa.Table) -> tuple[np.ndarray, list]:
+    token = table.column("token").combine_chunks()
+    classes = {symbol: int(cls) for symbol, cls in zip(REGISTRY.symbols, REGISTRY.classes)}
+    per_symbol = np.array([classes.get(s, OTHER) for s in token.dictionary.to_pylist()], dtype=np.int64)
+    return per_symbol[token.indices.to_numpy(zero_copy_only=False)], list(CLASS_NAMES)
+
+
+def size_key(table: pa.Table) -> tuple[np.ndarray, list]:
+    return np.searchsorted(SIZE_EDGES, table.column("amount").to_numpy(), side="right"), SIZE_LABELS
+
+
+def window_key(blocks: int) -> Callable:
+    """Key grouping by block window; labels are the window start blocks."""
+    def key(table: pa.Table) -> tuple[np.ndarray, list]:
+        windows = table.column("block").to_numpy() // blocks
+        first = int(windows.min()) if len(windows) else 0
+        last = int(windows.max()) if len(windows) else 0
+        return windows - first, [w * blocks for w in range(first, last + 1)]
+    key.spec = f"window:{blocks}"
+    return key
+
+
+GROUP_KEYS = {"token": token_key, "class": class_key, "size": size_key}
+
+
+def group_key(spec: str | Callable) -> Callable:
+    """Key function for a built-in name ("token", "window:100000", ...) or a callable."""
+    if callable(spec):
+        return spec
+    if spec.startswith("window:"):
+        return window_key(int(spec.split(":", 1)[1]))
+    if spec not in GROUP_KEYS:
+        raise ValueError(f"unknown group key {spec!r} (expected one of {sorted(GROUP_KEYS)} or window:<blocks>)")
+    return GROUP_KEYS[spec]
+
+
+def key_spec(key) -> str | None:
+    """Serializable name of a group key, None for arbitrary callables."""
+    return getattr(key, "spec", None) or (key if isinstance(key, str) else None)
+
+
+def group_codes(keys: list[Callable], table: pa.Table) -> tuple[np.ndarray, list]:
+    """Dense group code per row for a combination of keys, and each code's label.
+
+    Labels are the key's label for a single key, tuples for several.
+    """
+    codes = np.zeros(table.num_rows, dtype=np.int64)
+    labels = [()]
+    for key in keys:
+        key_codes, key_labels = key(table)
+        codes = codes * len(key_labels) + np.asarray(key_codes, dtype=np.int64)
+        labels = [prefix + (label,) for prefix in labels for label in key_labels]
+    if len(keys) == 1:
+        labels = [label[0] for label in labels]
+    used, codes = np.unique(codes, return_inverse=True)
+    return codes.reshape(-1), [labels[c] for c in used.tolist()]
+
+
+class Moments:
+    """count, min, max, sum and Welford mean / M2 of one value stream."""
+
+    __slots__ = ("count", "min", "max", "sum", "mean", "m2")
+
+    def __init__(self):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.sum = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x):
+        self.count += 1
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+        self.sum += x
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def combine(self, count: int, lo, hi, total, mean: float, m2: float):
+        """Fold in the moments of another batch of values (Chan et al.)."""
+        if not count:
+            return
+        n = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / n
+        self.m2 += m2 + delta * delta * self.count * count / n
+        self.count = n
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+        self.sum += total
+
+    def merge(self, other: Moments):
+        self.combine(other.count, other.min, other.max, other.sum, other.mean, other.m2)
+
+    @property
+    def avg(self) -> float:
+        return self.sum / self.count if self.count else math.nan
+
+    @property
+    def variance(self) -> float:
+        """Population variance."""
+        return self.m2 / self.count if self.count else math.nan
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def to_list(self) -> list:
+        return [self.count, self.min, self.max, self.sum, self.mean, self.m2]
+
+    @classmethod
+    def from_list(cls, values: list) -> Moments:
+        m = cls()
+        m.count, m.min, m.max, m.sum, m.mean, m.m2 = values
+        return m
+
+
+class GroupStats:
+    """Loan amount and gas moments of one group."""
+
+    __slots__ = ("amount", "gas")
+
+    def __init__(self):
+        self.amount = Moments()
+        self.gas = Moments()
+
+    @property
+    def count(self) -> int:
+        return self.amount.count
+
+    def merge(self, other: GroupStats):
+        self.amount.merge(other.amount)
+        self.gas.merge(other.gas)
+
+
+def _grouped_moments(codes: np.ndarray, values: np.ndarray, groups: int, as_int: bool):
+    """Per-group (count, min, max, sum, mean, m2) of values, codes in [0, groups)."""
+    counts = np.bincount(codes, minlength=groups)
+    order = np.argsort(codes, kind="stable")
+    present = np.flatnonzero(counts)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[present]
+    ordered = values[order]
+    lows = np.minimum.reduceat(ordered, starts)
+    highs = np.maximum.reduceat(ordered, starts)
+    sums = np.add.reduceat(ordered, starts)
+    means = sums / counts[present]
+    group_means = np.zeros(groups)
+    group_means[present] = means
+    dev = values - group_means[codes]
+    m2 = np.bincount(codes, weights=dev * dev, minlength=groups)[present]
+    convert = int if as_int else float
+    for i, g in enumerate(present.tolist()):
+        yield g, (int(counts[g]), convert(lows[i]), convert(highs[i]), convert(sums[i]), float(means[i]), float(m2[i]))
+
+
+class Aggregator:
+    """Running per-group loan amount and gas statistics, updated a table at a time."""
+
+    def __init__(self, keys=("token",)):
+        self.keys = [group_key(k) for k in keys]
+        self.key_specs = [key_spec(k) for k in keys]
+        self.groups: dict = {}
+
+    def _group(self, label) -> GroupStats:
+        stats = self.groups.get(label)
+        if stats is None:
+            stats = self.groups[label] = GroupStats()
+        return stats
+
+    def add_table(self, table: pa.Table | None):
+        """Fold one decoded event table (columns as decode_flashloan_table) into the totals."""
+        if table is None or table.num_rows == 0:
+            return
+        codes, labels = group_codes(self.keys, table)
+        amount = table.column("amount").to_numpy()
+        for g, moments in _grouped_moments(codes, amount, len(labels), as_int=False):
+            self._group(labels[g]).amount.combine(*moments)
+        gas = table.column("gas_used").to_numpy()
+        known = gas > 0
+        for g, moments in _grouped_moments(codes[known], gas[known], len(labels), as_int=True):
+            self._group(labels[g]).gas.combine(*moments)
+
+    def merge(self, other: Aggregator):
+        """Add another aggregator's totals (same keys), e.g. from another shard."""
+        for label, stats in other.groups.items():
+            self._group(label).merge(stats)
+
+    def items(self, by_count: bool = True) -> list[tuple]:
+        """(label, GroupStats) pairs, largest groups first."""
+        if by_count:
+            return sorted(self.groups.items(), key=lambda item: -item[1].count)
+        return sorted(self.groups.items())
+
+    def to_dict(self) -> dict:
+        if None in self.key_specs:
+            raise ValueError("only aggregators over named group keys can be serialized")
+        return {
+            "keys": self.key_specs,
+            "groups": [[list(label) if isinstance(label, tuple) else label,
+                        stats.amount.to_list(), stats.gas.to_list()]
+                       for label, stats in self.groups.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> Aggregator:
+        agg = cls(d["keys"])
+        for label, amount, gas in d["groups"]:
+            stats = agg._group(tuple(label) if isinstance(label, list) else label)
+            stats.amount = Moments.from_list(amount)
+            stats.gas = Moments.from_list(gas)
+        return agg
@@ -0,0 +1,147 @@
+"""
+On-disk checkpoint stores for resumable FlashLoan extraction.
+
+Each block range gets two files in the checkpoint directory:
+  <from>-<to>.rows.jsonl   decoded rows, one JSON list per line
+  <from>-<to>.state.json   next block to fetch + committed size of the rows file
+
+Rows are appended and fsynced before the state file is atomically replaced,
+so a crash between the two only loses the page that was being committed.
+OutputCheckpoint applies the same scheme to an append-only output file
+(e.g. the CSV written by --follow) via a <output>.state.json sidecar.
+"""
+from __future__ import annotations
+import json
+import os
+
+
+class CheckpointStore:
+    """Durable progress (next block + decoded rows) for one block range."""
+
+    def __init__(self, directory: str, from_block: int, to_block: int | None):
+        self.from_block = from_block
+        self.to_block = to_block
+        name = f"{from_block}-{to_block if to_block is not None else 'latest'}"
+        self.rows_path = os.path.join(directory, f"{name}.rows.jsonl")
+        self.state_path = os.path.join(directory, f"{name}.state.json")
+        os.makedirs(directory, exist_ok=True)
+        self.next_block = from_block
+        self.rows_bytes = 0
+        self.events = 0
+
+    def load(self) -> bool:
+        """Load saved state, returns False if there is none."""
+        if not os.path.exists(self.state_path):
+            return False
+        with open(self.state_path) as f:
+            state = json.load(f)
+        self.next_block = state["next_block"]
+        self.rows_bytes = state["rows_bytes"]
+        self.events = state["events"]
+        return True
+
+    def resume(self) -> int:
+        """Drop any rows written after the last durable commit, returns the block to continue from."""
+        if not self.load():
+            self.reset()
+            return self.from_block
+        with open(self.rows_path, "a+b") as f:
+            f.truncate(self.rows_bytes)
+        return self.next_block
+
+    def reset(self):
+        """Discard saved progress and start the range from scratch."""
+        self.next_block = self.from_block
+        self.rows_bytes = 0
+        self.events = 0
+        open(self.rows_path, "wb").close()
+        self._write_state()
+
+    @property
+    def done(self) -> bool:
+        return self.to_block is not None and self.next_block >= self.to_block
+
+    def commit_page(self, rows: list[list], next_block: int):
+        """Append one page of rows (FlashLoanEvent.to_list) and advance the durable next block."""
+        if rows:
+            data = "".join(json.dumps(row) + "\n" for row in rows).encode()
+            with open(self.rows_path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self.rows_bytes += len(data)
+            self.events += len(rows)
+        self.next_block = next_block
+        self._write_state()
+
+    def rows(self):
+        """Iterate over all committed rows, as lists for FlashLoanEvent.from_list."""
+        with open(self.rows_path, "rb") as f:
+            remaining = self.rows_bytes
+            for line in f:
+                if remaining <= 0:
+                    break
+                remaining -= len(line)
+                yield json.loads(line)
+
+    def _write_state(self):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "from_block": self.from_block,
+                "to_block": self.to_block,
+                "next_block": self.next_block,
+                "rows_bytes": self.rows_bytes,
+                "events": self.events,
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state_path)
+
+
+class OutputCheckpoint:
+    """Durable next block and committed size of an append-only output file.
+
+    Callers can store extra JSON state (e.g. running aggregates) alongside,
+    so a restarted follower continues both the file and its totals.
+    """
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.state_path = output_path + ".state.json"
+        self.next_block = 0
+        self.output_bytes = 0
+        self.extra: dict = {}
+
+    def load(self) -> bool:
+        """Load saved state, returns False if there is none (or no output file)."""
+        if not (os.path.exists(self.state_path) and os.path.exists(self.output_path)):
+            return False
+        with open(self.state_path) as f:
+            state = json.load(f)
+        self.next_block = state["next_block"]
+        self.output_bytes = state["output_bytes"]
+        self.extra = state.get("extra", {})
+        return True
+
+    def truncate_output(self):
+        """Drop anything appended to the output after the last commit."""
+        with open(self.output_path, "a+b") as f:
+            f.truncate(self.output_bytes)
+
+    def commit(self, next_block: int, output_bytes: int, extra: dict | None = None):
+        """Record that the output is durable up to output_bytes / next_block."""
+        self.next_block = next_block
+        self.output_bytes = output_bytes
+        if extra is not None:
+            self.extra = extra
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "next_block": self.next_block,
+                "output_bytes": self.output_bytes,
+                "extra": self.extra,
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state_path)
@@ -0,0 +1,284 @@
+"""
+Column-at-a-time FlashLoan decoding for HyperSync Arrow responses.
+
+Binary columns (topics, data, big-endian quantities) are gathered into
+fixed-width uint8 matrices with NumPy and decoded as whole columns, so no
+Python object is created per event. uint256 words are kept exact as 32-byte
+big-endian values (and as 4 x uint64 limbs for arithmetic). Hex-string data
+payloads from the non-Arrow client are decoded the same way, a page at a time.
+
+Requires: pip install numpy pyarrow
+"""
+from __future__ import annotations
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from tokens import REGISTRY, TokenRegistry
+
+# ASCII byte -> nibble value; 0xFF marks a non-hex character. NUL (right
+# padding of short payloads) decodes as 0.
+_NIBBLE = np.full(256, 0xFF, dtype=np.uint16)
+_NIBBLE[0] = 0
+_NIBBLE[np.frombuffer(b"0123456789", dtype=np.uint8)] = np.arange(10)
+_NIBBLE[np.frombuffer(b"abcdef", dtype=np.uint8)] = np.arange(10, 16)
+_NIBBLE[np.frombuffer(b"ABCDEF", dtype=np.uint8)] = np.arange(10, 16)
+
+# Two hex chars read as one little-endian uint16 -> byte value, so a payload
+# decodes with a single table gather; values above 0xFF mark invalid pairs.
+_pairs = np.arange(65536)
+_HEX_PAIR = np.where(
+    (_NIBBLE[_pairs & 0xFF] == 0xFF) | (_NIBBLE[_pairs >> 8] == 0xFF),
+    0xFFFF,
+    (_NIBBLE[_pairs & 0xFF] << 4) | _NIBBLE[_pairs >> 8],
+).astype(np.uint16)
+del _pairs
+
+# Exact powers of ten for decimals scaling, indexed by a uint8 decimals column.
+_POW10 = np.power(10.0, np.arange(256))
+
+
+def _binary_parts(arr) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(start offsets, lengths, value bytes) of a binary-like Arrow array."""
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    n = len(arr)
+    buffers = arr.buffers()
+    if pa.types.is_fixed_size_binary(arr.type):
+        width = arr.type.byte_width
+        values = np.frombuffer(buffers[1], dtype=np.uint8) if buffers[1] is not None else np.empty(0, np.uint8)
+        starts = (np.arange(n, dtype=np.int64) + arr.offset) * width
+        lengths = np.full(n, width, dtype=np.int64)
+    else:
+        offset_type = np.int64 if pa.types.is_large_binary(arr.type) or pa.types.is_large_string(arr.type) else np.int32
+        offsets = np.frombuffer(buffers[1], dtype=offset_type)[arr.offset:arr.offset + n + 1].astype(np.int64)
+        values = np.frombuffer(buffers[2], dtype=np.uint8) if buffers[2] is not None else np.empty(0, np.uint8)
+        starts = offsets[:-1]
+        lengths = np.diff(offsets)
+    if arr.null_count:
+        lengths = np.where(arr.is_null().to_numpy(zero_copy_only=False), 0, lengths)
+    return starts, lengths, values
+
+
+def gather_fixed(arr, width: int, align_right: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    """Copy each value of a binary column into an (n, width) uint8 matrix.
+
+    Values are zero-padded on the right (or on the left with align_right,
+    for big-endian quantities) and truncated to width. Also returns the
+    original byte lengths.
+    """
+    starts, lengths, values = _binary_parts(arr)
+    n = len(lengths)
+    out = np.zeros((n, width), dtype=np.uint8)
+    if n == 0:
+        return out, lengths
+
+    if np.all(lengths == width) and np.all(np.diff(starts) == width):
+        first = starts[0]
+        out[:] = values[first:first + n * width].reshape(n, width)
+        return out, lengths
+
+    take = np.minimum(lengths, width)
+    shift = lengths - take if align_right else 0
+    full = np.flatnonzero(take == width)
+    if len(full):
+        src = (starts + shift)[full]
+        for j in range(width):
+            out[full, j] = values[src + j]
+
+    part = np.flatnonzero((take > 0) & (take < width))
+    if len(part):
+        take = take[part]
+        total = int(take.sum())
+        rows = np.repeat(part, take)
+        col = np.arange(total) - np.repeat(np.cumsum(take) - take, take)
+        src = np.repeat((starts + shift)[part], take) + col
+        if align_right:
+            col = col + np.repeat(width - take, take)
+        out[rows, col] = values[src]
+    return out, lengths
+
+
+def words_to_limbs(words: np.ndarray) -> np.ndarray:
+    """(n, 32) big-endian uint256 bytes -> (n, 4) uint64 limbs, most significant first."""
+    return np.ascontiguousarray(words).view(">u8").reshape(-1, 4).astype(np.uint64)
+
+
+def limbs_to_float(limbs: np.ndarray) -> np.ndarray:
+    """Nearest float64 of each uint256 given as (n, 4) uint64 limbs."""
+    out = np.zeros(len(limbs), dtype=np.float64)
+    for i in range(4):
+        out = out * 18446744073709551616.0 + limbs[:, i].astype(np.float64)
+    return out
+
+
+def words_to_ints(words: np.ndarray) -> list[int]:
+    """(n, 32) big-endian uint256 bytes -> exact Python ints, for row output."""
+    buf = np.ascontiguousarray(words).tobytes()
+    return [int.from_bytes(buf[i:i + 32], "big") for i in range(0, len(buf), 32)]
+
+
+def rows_to_bytes(matrix: np.ndarray, present: np.ndarray | None = None) -> list[bytes]:
+    """(n, width) uint8 matrix -> one bytes object per row, b"" where not present."""
+    width = matrix.shape[1]
+    buf = np.ascontiguousarray(matrix).tobytes()
+    out = [buf[i:i + width] for i in range(0, len(buf), width)]
+    if present is not None:
+        out = [value if ok else b"" for value, ok in zip(out, present.tolist())]
+    return out
+
+
+def scale_by_decimals(limbs: np.ndarray, decimals: np.ndarray) -> np.ndarray:
+    """uint256 (n, 4) limbs / 10**decimals as float64, for amounts in token units."""
+    return limbs_to_float(limbs) / _POW10[decimals]
+
+
+def hex_words(payloads, words: int) -> tuple[np.ndarray, np.ndarray]:
+    """Decode "0x..." hex payloads into (n, words, 32) uint8 big-endian words.
+
+    The strings are packed into one Arrow buffer, gathered into a fixed-width
+    char matrix and mapped two chars at a time through a lookup table. Words a payload does
+    not fully cover (and None payloads) are zero. Also returns how many
+    complete words each payload had.
+    """
+    arr = payloads if isinstance(payloads, (pa.Array, pa.ChunkedArray)) else pa.array(payloads, pa.string())
+    chars, lengths = gather_fixed(arr, 2 + 64 * words)
+    values = _HEX_PAIR[chars[:, 2:].view("<u2")]
+    if (values > 0xFF).any():
+        raise ValueError("data payload contains non-hex characters")
+    out = values.astype(np.uint8).reshape(-1, words, 32)
+    complete = np.clip((lengths - 2) // 64, 0, words)
+    out *= (np.arange(words) < complete[:, None])[:, :, None]
+    return out, complete
+
+
+def quantity_to_uint64(arr) -> np.ndarray:
+    """Big-endian binary (or integer) quantity column -> uint64, nulls as 0."""
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    if pa.types.is_integer(arr.type):
+        return pc.fill_null(arr, 0).to_numpy(zero_copy_only=False).astype(np.uint64)
+    starts, lengths, values = _binary_parts(arr)
+    out = np.zeros(len(lengths), dtype=np.uint64)
+    if not len(values):
+        return out
+    last = starts + lengths - 1
+    for j in range(min(8, int(lengths.max(initial=0)))):
+        has = lengths > j
+        byte = values[np.where(has, last - j, 0)].astype(np.uint64)
+        out |= np.where(has, byte << np.uint64(8 * j), np.uint64(0))
+    return out
+
+
+def fixed_matrix(arr) -> np.ndarray:
+    """(n, width) uint8 view of a fixed_size_binary column, without copying."""
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    width = arr.type.byte_width
+    data = np.frombuffer(arr.buffers()[1], dtype=np.uint8)
+    return data[arr.offset * width:(arr.offset + len(arr)) * width].reshape(len(arr), width)
+
+
+def fixed_binary_array(matrix: np.ndarray, valid: np.ndarray | None = None) -> pa.FixedSizeBinaryArray:
+    """(n, width) uint8 matrix -> Arrow fixed_size_binary(width) without per-row copies.
+
+    Rows where the optional boolean mask valid is False are null.
+    """
+    n, width = matrix.shape
+    data = pa.py_buffer(np.ascontiguousarray(matrix))
+    validity = None
+    if valid is not None and not valid.all():
+        validity = pa.py_buffer(np.packbits(valid, bitorder="little"))
+    return pa.FixedSizeBinaryArray.from_buffers(pa.binary(width), n, [validity, data])
+
+
+def valid_mask(arr) -> np.ndarray:
+    """Boolean numpy mask of the non-null rows of a column."""
+    return arr.is_valid().to_numpy(zero_copy_only=False)
+
+
+def decode_flashloan_table(logs: pa.Table, txs: pa.Table | None, registry: TokenRegistry = REGISTRY) -> pa.Table:
+    """Decode one page of FlashLoan logs (Arrow) into a typed event table.
+
+    The token column is categorical: uint16 registry ids with the registry's
+    symbols as dictionary. Each distinct token is looked up once per page.
+    """
+    n = logs.num_rows
+
+    token_ids = registry.lookup_many(logs.column("topic2"))
+    decimals = registry.decimals[token_ids]
+    token_topic, _ = gather_fixed(logs.column("topic2"), 32)
+    token_address = token_topic[:, 12:]
+
+    data, data_lengths = gather_fixed(logs.column("data"), 64)
+    amount_words = np.where((data_lengths >= 32)[:, None], data[:, :32], 0).astype(np.uint8)
+    fee_words = np.where((data_lengths >= 64)[:, None], data[:, 32:], 0).astype(np.uint8)
+    amount = scale_by_decimals(words_to_limbs(amount_words), decimals)
+
+    gas_used = np.zeros(n, dtype=np.uint64)
+    gas_price = np.zeros(n, dtype=np.uint64)
+    if txs is not None and txs.num_rows:
+        idx = pc.index_in(logs.column("transaction_hash"), value_set=txs.column("hash").combine_chunks())
+        found = idx.is_valid().to_numpy(zero_copy_only=False)
+        idx = pc.fill_null(idx, 0).to_numpy(zero_copy_only=False)
+        gas_used = np.where(found, quantity_to_uint64(txs.column("gas_used"))[idx], 0).astype(np.uint64)
+        gas_price = np.where(found, quantity_to_uint64(txs.column("gas_price"))[idx], 0).astype(np.uint64)
+
+    recipient, recipient_lengths = gather_fixed(logs.column("topic1"), 32)
+
+    return pa.table({
+        "tx_hash": pc.cast(logs.column("transaction_hash"), pa.binary(32)),
+        "block": pc.cast(logs.column("block_number"), pa.uint64()),
+        "token": registry.dictionary(token_ids),
+        "token_address": fixed_binary_array(token_address),
+        "amount_raw": fixed_binary_array(amount_words),
+        "amount": amount,
+        "decimals": decimals,
+        "fee_raw": fixed_binary_array(fee_words),
+        "gas_used": gas_used,
+        "gas_price_gwei": gas_price.astype(np.float64) / 1e9,
+        "recipient": fixed_binary_array(recipient[:, 12:], recipient_lengths >= 32),
+    })
+
+
+def decode_flashloan_page(page) -> pa.Table | None:
+    """decode_flashloan_table for one Arrow response page, None if it has no logs.
+
+    A module-level function so pages can be decoded in a process pool.
+    """
+    logs = page.data.logs
+    if logs is None or logs.num_rows == 0:
+        return None
+    return decode_flashloan_table(logs, page.data.transactions)
+
+
+def events_table(events: list, registry: TokenRegistry = REGISTRY) -> pa.Table:
+    """FlashLoanEvent records -> the same typed table as decode_flashloan_table."""
+    n = len(events)
+    token_ids = np.fromiter((e.token_id for e in events), dtype=np.uint16, count=n)
+    addresses = [a or bytes(20) for a in registry.addresses]
+
+    def fixed(values, width):
+        return pa.array(values, pa.binary(width))
+
+    return pa.table({
+        "tx_hash": fixed([e.tx_hash for e in events], 32),
+        "block": np.fromiter((e.block for e in events), dtype=np.uint64, count=n),
+        "token": registry.dictionary(token_ids),
+        "token_address": fixed([addresses[i] for i in token_ids], 20),
+        "amount_raw": fixed([e.amount_raw.to_bytes(32, "big") for e in events], 32),
+        "amount": np.fromiter((e.amount for e in events), dtype=np.float64, count=n),
+        "decimals": registry.decimals[token_ids],
+        "fee_raw": fixed([e.fee_raw.to_bytes(32, "big") for e in events], 32),
+        "gas_used": np.fromiter((e.gas_used for e in events), dtype=np.uint64, count=n),
+        "gas_price_gwei": np.fromiter((e.gas_price for e in events), dtype=np.float64, count=n) / 1e9,
+        "recipient": fixed([e.recipient or None for e in events], 20),
+    })
+
+
+def concat_events(tables: list) -> pa.Table | None:
+    """Per-page event tables as one table with a single token dictionary, None if empty."""
+    tables = [t for t in tables if t is not None]
+    if not tables:
+        return None
+    return pa.concat_tables(tables, promote_options="permissive").unify_dictionaries()
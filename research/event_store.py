@@ -0,0 +1,225 @@
+"""
+Embedded SQLite store of decoded FlashLoan events for ad-hoc queries.
+
+The extractor loads events with --db; afterwards questions are answered from
+the local file instead of re-fetching and re-decoding:
+
+  python event_store.py flashloans.db stats --token USDC
+  python event_store.py flashloans.db top-recipients --from-block 20000000 --to-block 20100000
+  python event_store.py flashloans.db tx 0x...
+  python event_store.py flashloans.db sql "SELECT token, MIN(gas_used) FROM events WHERE gas_used > 0 GROUP BY token"
+
+Hashes and addresses are stored as BLOBs and uint256 amounts as 32-byte
+big-endian BLOBs (exact, and ordered like the numbers), next to the scaled
+REAL amount; a log without a recipient topic has a NULL recipient. Rows are indexed on block, (token, block), recipient and
+tx_hash. Each load replaces the block range it covers, so re-running a range
+or resuming a stream never duplicates events.
+
+Requires: pip install numpy pyarrow
+"""
+from __future__ import annotations
+import argparse
+import sqlite3
+import time
+
+import numpy as np
+import pyarrow as pa
+
+from events import CSV_FIELDS
+
+TABLE = """CREATE TABLE IF NOT EXISTS events (
+    tx_hash BLOB NOT NULL,
+    block INTEGER NOT NULL,
+    token TEXT NOT NULL,
+    token_address BLOB,
+    amount_raw BLOB NOT NULL,
+    amount REAL NOT NULL,
+    decimals INTEGER NOT NULL,
+    fee_raw BLOB NOT NULL,
+    gas_used INTEGER NOT NULL,
+    gas_price_gwei REAL NOT NULL,
+    recipient BLOB
+)"""
+
+INDEXES = {
+    "events_block": "block",
+    "events_token_block": "token, block",
+    "events_recipient": "recipient",
+    "events_tx_hash": "tx_hash",
+}
+
+# Loads this large are inserted without indexes, which are rebuilt afterwards.
+BULK_ROWS = 100_000
+
+INSERT = f"INSERT INTO events ({', '.join(CSV_FIELDS)}) VALUES ({', '.join('?' * len(CSV_FIELDS))})"
+
+
+def _values(arr: pa.Array) -> list:
+    """Python values of one column for executemany, without Arrow's per-value scalars."""
+    if pa.types.is_dictionary(arr.type):
+        symbols = np.array(arr.dictionary.to_pylist(), dtype=object)
+        return symbols[arr.indices.to_numpy(zero_copy_only=False)].tolist()
+    if pa.types.is_fixed_size_binary(arr.type):
+        width = arr.type.byte_width
+        data = arr.buffers()[1].to_pybytes()[arr.offset * width:(arr.offset + len(arr)) * width]
+        values = [data[i:i + width] for i in range(0, len(data), width)]
+        if arr.null_count:
+            values = [v if ok else None for v, ok in zip(values, arr.is_valid().to_pylist())]
+        return values
+    if arr.null_count == 0 and (pa.types.is_integer(arr.type) or pa.types.is_floating(arr.type)):
+        return arr.to_numpy().tolist()
+    return arr.to_pylist()
+
+
+class EventStore:
+    """SQLite event table; loads replace whole block ranges."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(TABLE)
+        self.create_indexes()
+        self.next_block: int | None = None
+
+    def replace_range(self, table: pa.Table | None, from_block: int, to_block: int | None) -> int:
+        """Delete events in [from_block, to_block) and insert the table's rows, in one transaction."""
+        with self.conn:
+            if to_block is None:
+                self.conn.execute("DELETE FROM events WHERE block >= ?", (from_block,))
+            else:
+                self.conn.execute("DELETE FROM events WHERE block >= ? AND block < ?", (from_block, to_block))
+            if table is None or table.num_rows == 0:
+                return 0
+            bulk = table.num_rows >= BULK_ROWS
+            if bulk:
+                for name in INDEXES:
+                    self.conn.execute(f"DROP INDEX IF EXISTS {name}")
+            for batch in table.to_batches(max_chunksize=64 * 1024):
+                columns = [_values(batch.column(name)) for name in CSV_FIELDS]
+                self.conn.executemany(INSERT, zip(*columns))
+            if bulk:
+                self.create_indexes()
+        return table.num_rows
+
+    def create_indexes(self):
+        for name, columns in INDEXES.items():
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON events ({columns})")
+
+    def start(self, from_block: int):
+        """Begin loading consecutive pages from from_block (see load_page)."""
+        self.next_block = from_block
+
+    def load_page(self, table: pa.Table | None, next_block: int) -> int:
+        """Replace the blocks from the previous page's end up to next_block with table."""
+        rows = self.replace_range(table, self.next_block, next_block)
+        self.next_block = next_block
+        return rows
+
+    def query(self, sql: str, params=()) -> tuple[list[str], list[tuple]]:
+        cur = self.conn.execute(sql, params)
+        names = [d[0] for d in cur.description] if cur.description else []
+        return names, cur.fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+def _format(value) -> str:
+    if isinstance(value, bytes):
+        return "0x" + value.hex()
+    if isinstance(value, float):
+        return f"{value:,.4f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return "" if value is None else str(value)
+
+
+def print_rows(names: list[str], rows: list[tuple]):
+    """Print a result set as an aligned text table."""
+    cells = [[_format(v) for v in row] for row in rows]
+    widths = [max([len(n)] + [len(r[i]) for r in cells]) for i, n in enumerate(names)]
+    print("  ".join(n.ljust(w) for n, w in zip(names, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in cells:
+        print("  ".join(v.rjust(w) if v[:1].isdigit() else v.ljust(w) for v, w in zip(row, widths)))
+
+
+def _where(args) -> tuple[str, list]:
+    terms, params = [], []
+    if getattr(args, "token", None):
+        terms.append(f"token IN ({', '.join('?' * len(args.token))})")
+        params.extend(args.token)
+    if getattr(args, "from_block", None) is not None:
+        terms.append("block >= ?")
+        params.append(args.from_block)
+    if getattr(args, "to_block", None) is not None:
+        terms.append("block < ?")
+        params.append(args.to_block)
+    return (" WHERE " + " AND ".join(terms) if terms else ""), params
+
+
+def stats_query(args) -> tuple[str, list]:
+    where, params = _where(args)
+    gas = "CASE WHEN gas_used > 0 THEN gas_used END"
+    return (f"SELECT token, COUNT(*) AS loans, MIN(amount) AS min_amount, MAX(amount) AS max_amount, "
+            f"SUM(amount) AS total_amount, MIN({gas}) AS min_gas, AVG({gas}) AS avg_gas, MAX({gas}) AS max_gas "
+            f"FROM events{where} GROUP BY token ORDER BY loans DESC"), params
+
+
+def top_recipients_query(args) -> tuple[str, list]:
+    where, params = _where(args)
+    where += (" AND " if where else " WHERE ") + "recipient IS NOT NULL"
+    order = "total_amount" if args.by == "volume" else "loans"
+    return (f"SELECT recipient, COUNT(*) AS loans, SUM(amount) AS total_amount "
+            f"FROM events{where} GROUP BY recipient ORDER BY {order} DESC LIMIT ?"), params + [args.limit]
+
+
+def tx_query(args) -> tuple[str, list]:
+    tx = bytes.fromhex(args.tx_hash[2:] if args.tx_hash.startswith("0x") else args.tx_hash)
+    return f"SELECT {', '.join(CSV_FIELDS)} FROM events WHERE tx_hash = ?", [tx]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Query a FlashLoan event store")
+    parser.add_argument("db")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def filters(p):
+        p.add_argument("--token", action="append", default=None, help="token symbol (repeatable)")
+        p.add_argument("--from-block", type=int, default=None)
+        p.add_argument("--to-block", type=int, default=None, help="exclusive")
+
+    p = sub.add_parser("stats", help="per-token loan count, amount and gas")
+    filters(p)
+    p.set_defaults(build=stats_query)
+    p = sub.add_parser("top-recipients", help="recipients with the most loans or volume")
+    filters(p)
+    p.add_argument("--by", choices=["count", "volume"], default="count")
+    p.add_argument("--limit", type=int, default=20)
+    p.set_defaults(build=top_recipients_query)
+    p = sub.add_parser("tx", help="events of one transaction")
+    p.add_argument("tx_hash")
+    p.set_defaults(build=tx_query)
+    p = sub.add_parser("sql", help="run a SQL query against the events table")
+    p.add_argument("query")
+    p.set_defaults(build=lambda args: (args.query, []))
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    store = EventStore(args.db)
+    sql, params = args.build(args)
+    t0 = time.perf_counter()
+    names, rows = store.query(sql, params)
+    elapsed = time.perf_counter() - t0
+    if names:
+        print_rows(names, rows)
+    print(f"({len(rows):,} rows in {elapsed * 1000:.1f} ms)")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
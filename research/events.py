@@ -0,0 +1,72 @@
+"""
+Compact record type for decoded FlashLoan events.
+
+One FlashLoanEvent per event instead of an 11-key dict: the fields live in
+__slots__, the token is a registry id (symbol and decimals are looked up
+from the shared registry on demand) and gas price is kept as the raw wei
+integer. The tx hash (32 bytes), token address and recipient (20 bytes) are
+binary and only hex-encoded on output (the token address is shared from the
+registry rather than stored per event): CSV writers take row() tuples,
+checkpoint files to_list() arrays.
+"""
+from __future__ import annotations
+
+from tokens import REGISTRY
+
+CSV_FIELDS = [
+    "tx_hash", "block", "token", "token_address",
+    "amount_raw", "amount", "decimals", "fee_raw",
+    "gas_used", "gas_price_gwei", "recipient"
+]
+
+
+class FlashLoanEvent:
+    """One decoded FlashLoan event."""
+
+    __slots__ = ("tx_hash", "block", "token_id", "amount_raw", "amount",
+                 "fee_raw", "gas_used", "gas_price", "recipient")
+
+    def __init__(self, tx_hash, block, token_id, amount_raw, amount,
+                 fee_raw, gas_used, gas_price, recipient):
+        self.tx_hash = tx_hash
+        self.block = block
+        self.token_id = token_id
+        self.amount_raw = amount_raw
+        self.amount = amount
+        self.fee_raw = fee_raw
+        self.gas_used = gas_used
+        self.gas_price = gas_price
+        self.recipient = recipient
+
+    @property
+    def token(self) -> str:
+        return REGISTRY.symbols[self.token_id]
+
+    @property
+    def token_address(self) -> bytes:
+        return REGISTRY.addresses[self.token_id] or b""
+
+    @property
+    def decimals(self) -> int:
+        return int(REGISTRY.decimals[self.token_id])
+
+    @property
+    def gas_price_gwei(self):
+        return self.gas_price / 1e9 if self.gas_price else 0
+
+    def row(self) -> tuple:
+        """Values in CSV_FIELDS order, hashes and addresses hex-encoded."""
+        return ("0x" + self.tx_hash.hex(), self.block, self.token, self.token_address.hex(),
+                self.amount_raw, self.amount, self.decimals, self.fee_raw,
+                self.gas_used, self.gas_price_gwei, self.recipient.hex())
+
+    def to_list(self) -> list:
+        """JSON-serializable form; the token is stored by address, as ids are per process."""
+        return ["0x" + self.tx_hash.hex(), self.block, self.token_address.hex(), self.amount_raw,
+                self.amount, self.fee_raw, self.gas_used, self.gas_price, self.recipient.hex()]
+
+    @classmethod
+    def from_list(cls, values: list) -> FlashLoanEvent:
+        tx_hash, block, token_address, amount_raw, amount, fee_raw, gas_used, gas_price, recipient = values
+        return cls(bytes.fromhex(tx_hash[2:]), block, REGISTRY.lookup(token_address),
+                   amount_raw, amount, fee_raw, gas_used, gas_price, bytes.fromhex(recipient))
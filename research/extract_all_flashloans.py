@@ -3,39 +3,59 @@
 Extract ALL Balancer V2 FlashLoan events with loan sizes using Envio HyperSync.
 Exports to CSV for analysis.
 
-Requires: pip install hypersync
+Requires: pip install hypersync numpy pyarrow
 """
 from __future__ import annotations
 import hypersync
+import argparse
 import asyncio
+import itertools
 import os
-import csv
+import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional
 from datetime import datetime
 
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from aggregate import SIZE_LABELS, Aggregator
+from checkpoint import CheckpointStore, OutputCheckpoint
+from columnar import (
+    concat_events, decode_flashloan_page, events_table, hex_words, rows_to_bytes, scale_by_decimals,
+    words_to_ints, words_to_limbs,
+)
+from csv_sink import CsvSink
+from event_store import EventStore
+from events import FlashLoanEvent
+from heavy_hitters import DEFAULT_CAPACITY, RecipientTopK
+from hypersync_stream import follow_pages, iter_pages
+from metrics import RunMetrics
+from page_schema import PageSchema, SchemaDecoder, tx_loader
+from parquet_sink import DEFAULT_WINDOW, PartitionedParquetSink
+from pipeline import run_pipeline
+from quantiles import DEFAULT_K, PERCENTILES, GroupedQuantiles, k_for_error
+from report import compute_report, load_events, render_markdown, render_tables
+from response_cache import CachedPage, ResponseCache
+from rollups import RollupWriter, check_rollups, write_rollups
+from scheduler import RequestScheduler, schedule
+from snapshot import SnapshotWriter, write_snapshot
+from tokens import CLASS_NAMES, REGISTRY, STABLECOIN
+from tx_store import TxJoinStore
+
 BALANCER_VAULT = "0xBA12222222228d8Ba445958a75a0704d566BF2C8"
 FLASHLOAN_TOPIC = "0x0d7d75e01ab95780d3cd1c8ec0dd6c2ce19e3a20427eec8bf53283b6fb8e95f0"
 
-KNOWN_TOKENS = {
-    "0x000000000000000000000000a0b86991c6218b36c1d19d4a2e9eb0ce3606eb48": ("USDC", 6),
-    "0x000000000000000000000000dac17f958d2ee523a2206206994597c13d831ec7": ("USDT", 6),
-    "0x0000000000000000000000006b175474e89094c44da98b954eedeac495271d0f": ("DAI", 18),
-    "0x000000000000000000000000853d955acef822db058eb8505911ed77f175b99e": ("FRAX", 18),
-    "0x0000000000000000000000005f98805a4e8be255a32880fdec7f6728c6568ba0": ("LUSD", 18),
-    "0x000000000000000000000000c02aaa39b223fe8d0a0e5c4f27ead9083c756cc2": ("WETH", 18),
-    "0x0000000000000000000000002260fac5e5542a773aa44fbcfedf7c193bc2c599": ("WBTC", 8),
-    "0x000000000000000000000000cd5fe23c85820f7b72d0926fc9b05b43e359b7ee": ("weETH", 18),
-    "0x0000000000000000000000007f39c581f595b53c5cb19bd0b3f8da6c935e2ca0": ("wstETH", 18),
-    "0x000000000000000000000000ae78736cd615f374d3085123a210448e74fc6393": ("rETH", 18),
-    "0x000000000000000000000000be9895146f7af43049ca1c1ae358b0541ea49704": ("cbETH", 18),
-    "0x000000000000000000000000a35b1b31ce002fbf2058d22f30f95d405200a15b": ("ETHx", 18),
-    "0x000000000000000000000000ac3e018457b222d93114458476f3e3416abbe38f": ("sfrxETH", 18),
-}
-
-
-async def query_flashloans(from_block: int, to_block: int | None = None):
-    """Query ALL FlashLoan events from Balancer Vault."""
-    
+DEFAULT_CHECKPOINT_DIR = "flashloan_checkpoints"
+DEFAULT_CACHE_DIR = "hypersync_cache"
+
+CSV_FILE = "balancer_flashloans_full.csv"
+PARQUET_FILE = "balancer_flashloans_full.parquet"
+TABLE_ROWS = 64 * 1024  # checkpoint rows turned into one table at a time
+
+
+def make_client(metrics: RunMetrics | None = None) -> RequestScheduler:
+    """Create a rate-limited, retrying HyperSync client, authenticated if an API key is set."""
     api_token = os.environ.get("ENVIO_API_KEY") or os.environ.get("ENVIO_API_TOKEN")
     if not api_token:
         print("[WARN] No ENVIO_API_KEY found, rate limited mode")
@@ -46,9 +66,12 @@ async def query_flashloans(from_block: int, to_block: int | None = None):
             bearer_token=api_token
         )
     
-    client = hypersync.HypersyncClient(config)
-    
-    query = hypersync.Query(
+    return schedule(hypersync.HypersyncClient(config), authenticated=bool(api_token), metrics=metrics)
+
+
+def build_query(from_block: int, to_block: int | None = None) -> hypersync.Query:
+    """Build the FlashLoan log query with joined gas fields."""
+    return hypersync.Query(
         from_block=from_block,
         to_block=to_block,
         logs=[
@@ -75,151 +98,984 @@ async def query_flashloans(from_block: int, to_block: int | None = None):
         include_all_blocks=False,
         join_mode=hypersync.JoinMode.JOIN_ALL,
     )
+
+
+def shard_ranges(from_block: int, to_block: int, shards: int) -> list[tuple[int, int]]:
+    """Split [from_block, to_block) into up to `shards` contiguous sub-ranges."""
+    shards = max(1, min(shards, to_block - from_block))
+    step, extra = divmod(to_block - from_block, shards)
+    ranges = []
+    start = from_block
+    for i in range(shards):
+        end = start + step + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def open_pages(
+    client: RequestScheduler,
+    from_block: int,
+    to_block: int | None,
+    limiter: asyncio.Semaphore | None = None,
+    cache_dir: str | None = None,
+):
+    """Response pages for a block range, served from the local cache when one is given."""
+    query = build_query(from_block, to_block)
+    if cache_dir is None:
+        return iter_pages(client, query, to_block, limiter)
+    return ResponseCache(cache_dir, query).pages(client, query, to_block, limiter)
+
+
+def print_progress(label: str, events: int, from_block: int, to_block: int | None, res):
+    target = to_block or res.archive_height
+    pct = (res.next_block - from_block) / (target - from_block) * 100 if target > from_block else 100
+    print(f"  {label}{events:,} events | block {res.next_block:,} | {pct:.1f}%")
+
+
+async def fetch_range(
+    client: RequestScheduler,
+    from_block: int,
+    to_block: int | None,
+    limiter: asyncio.Semaphore | None = None,
+    label: str = "",
+    cache_dir: str | None = None,
+    decode: SchemaDecoder | None = None,
+    metrics: RunMetrics | None = None,
+) -> pa.Table | None:
+    """Page through one block range, decoding each page against its own txs.
     
-    print(f"Querying FlashLoan events from block {from_block} to {to_block or 'latest'}...")
-    
-    all_logs = []
-    all_txs = {}
+    Each page's records become a columnar table straight away, so the range
+    is held at about 170 bytes per event instead of one object each.
+    """
+    decode = decode or flashloan_decoder()
+    tables = []
+    count = 0
+    position = from_block
     
-    while True:
-        res = await client.get(query)
-        
-        if res.data.logs:
-            all_logs.extend(res.data.logs)
-        
-        if res.data.transactions:
-            for tx in res.data.transactions:
-                if hasattr(tx, 'hash') and tx.hash:
-                    all_txs[tx.hash] = tx
-        
-        target = to_block or res.archive_height
-        pct = (res.next_block - from_block) / (target - from_block) * 100 if target > from_block else 100
-        print(f"  {len(all_logs):,} events | block {res.next_block:,} | {pct:.1f}%")
+    async for res in open_pages(client, from_block, to_block, limiter, cache_dir):
+        t0 = time.perf_counter()
+        rows = decode(res)
+        if rows:
+            tables.append(events_table(rows))
+            count += len(rows)
+        if metrics is not None:
+            metrics.record_decode(time.perf_counter() - t0)
+            metrics.record_page(rows, res.next_block - position)
+        position = res.next_block
         
-        if res.next_block >= target:
-            break
-        
-        query.from_block = res.next_block
+        print_progress(label, count, from_block, to_block, res)
     
-    return all_logs, all_txs
+    return concat_events(tables)
 
 
-def decode_flashloan_log(log, txs):
-    """Decode a FlashLoan event log with loan size."""
-    recipient_topic = log.topics[1] if len(log.topics) > 1 else None
-    token_topic = log.topics[2] if len(log.topics) > 2 else None
-    
-    token_info = KNOWN_TOKENS.get(token_topic)
-    if token_info:
-        token_name, decimals = token_info
+async def checkpoint_range(
+    client: RequestScheduler,
+    store: CheckpointStore,
+    resume: bool,
+    limiter: asyncio.Semaphore | None = None,
+    label: str = "",
+    cache_dir: str | None = None,
+    decode: SchemaDecoder | None = None,
+    metrics: RunMetrics | None = None,
+):
+    """Fetch one range into its checkpoint store, decoding and committing page by page."""
+    decode = decode or flashloan_decoder()
+    if resume:
+        start = store.resume()
     else:
-        token_name = token_topic[26:42] + "..." if token_topic else "Unknown"
-        decimals = 18
-    
-    amount_raw = 0
-    fee_raw = 0
-    if log.data and len(log.data) >= 66:
-        amount_raw = int(log.data[2:66], 16)
-        if len(log.data) >= 130:
-            fee_raw = int(log.data[66:130], 16)
-    
-    amount_formatted = amount_raw / (10 ** decimals)
-    
-    tx = txs.get(log.transaction_hash)
-    gas_used = 0
-    gas_price = 0
-    if tx:
-        if hasattr(tx, 'gas_used') and tx.gas_used:
-            gas_used = int(tx.gas_used, 16) if isinstance(tx.gas_used, str) else tx.gas_used
-        if hasattr(tx, 'gas_price') and tx.gas_price:
-            gas_price = int(tx.gas_price, 16) if isinstance(tx.gas_price, str) else tx.gas_price
-    
-    return {
-        "tx_hash": log.transaction_hash,
-        "block": log.block_number,
-        "token": token_name,
-        "token_address": token_topic[26:] if token_topic else "",
-        "amount_raw": amount_raw,
-        "amount": amount_formatted,
-        "decimals": decimals,
-        "fee_raw": fee_raw,
-        "gas_used": gas_used,
-        "gas_price_gwei": gas_price / 1e9 if gas_price else 0,
-        "recipient": recipient_topic[26:] if recipient_topic else "",
-    }
+        store.reset()
+        start = store.from_block
+    
+    if store.done:
+        print(f"  {label}already complete ({store.events:,} events)")
+        return
+    if start > store.from_block:
+        print(f"  {label}resuming at block {start:,} ({store.events:,} events saved)")
+    
+    async for res in open_pages(client, start, store.to_block, limiter, cache_dir):
+        t0 = time.perf_counter()
+        rows = decode(res)
+        t1 = time.perf_counter()
+        store.commit_page([e.to_list() for e in rows], res.next_block)
+        if metrics is not None:
+            metrics.record_decode(t1 - t0)
+            metrics.record_write(time.perf_counter() - t1)
+            metrics.record_page(rows, res.next_block - start)
+        start = res.next_block
+        print_progress(label, store.events, store.from_block, store.to_block, res)
 
 
-async def main():
-    from_block = 19000000
-    to_block = 21000000
+async def resolve_ranges(client, from_block: int, to_block: int | None, shards: int):
+    """Block ranges to fetch: the whole range, or `shards` contiguous sub-ranges."""
+    if shards <= 1:
+        return [(from_block, to_block)]
+    if to_block is None:
+        to_block = await client.get_height()
+    return shard_ranges(from_block, to_block, shards)
+
+
+async def query_flashloans(
+    from_block: int,
+    to_block: int | None = None,
+    shards: int = 1,
+    concurrency: int = 4,
+    cache_dir: str | None = None,
+    strict: bool = False,
+    metrics: RunMetrics | None = None,
+) -> pa.Table | None:
+    """Query and decode ALL FlashLoan events from Balancer Vault into an event table.
     
-    logs, txs = await query_flashloans(from_block, to_block)
+    With shards > 1 the range is split into contiguous sub-ranges fetched as
+    concurrent tasks, at most `concurrency` requests in flight at once.
+    Results are merged back in block order. With a cache_dir, block windows
+    already fetched are read from local Parquet segments.
+    """
     
-    print(f"\n{'='*80}")
-    print(f"Found {len(logs):,} FlashLoan events")
-    print(f"{'='*80}\n")
+    client = make_client(metrics)
+    decode = flashloan_decoder(strict)
+    
+    print(f"Querying FlashLoan events from block {from_block} to {to_block or 'latest'}...")
+    
+    if shards <= 1:
+        return await fetch_range(client, from_block, to_block, cache_dir=cache_dir,
+                                 decode=decode, metrics=metrics)
+    
+    ranges = await resolve_ranges(client, from_block, to_block, shards)
+    limiter = asyncio.Semaphore(max(1, concurrency))
+    print(f"  {len(ranges)} shards, {concurrency} concurrent requests")
+    
+    results = await asyncio.gather(*(
+        fetch_range(client, start, end, limiter, f"[shard {i + 1}/{len(ranges)}] ", cache_dir, decode, metrics)
+        for i, (start, end) in enumerate(ranges)
+    ))
+    
+    return concat_events(results)
+
+
+async def extract_flashloans(
+    from_block: int,
+    to_block: int | None = None,
+    shards: int = 1,
+    concurrency: int = 4,
+    checkpoint_dir: str | None = None,
+    resume: bool = False,
+    cache_dir: str | None = None,
+    strict: bool = False,
+    metrics: RunMetrics | None = None,
+) -> pa.Table | None:
+    """Fetch and decode all FlashLoan events in block order, as one table (None if none).
+    
+    With a checkpoint_dir every page is decoded and committed to disk as it
+    arrives, and resume=True continues each range from its last durable block.
+    Resuming a sharded run needs the same range and shard count. With
+    strict=True a page whose shape differs from the first one raises
+    SchemaMismatch instead of being decoded generically.
+    """
+    if checkpoint_dir is None:
+        return await query_flashloans(from_block, to_block, shards, concurrency, cache_dir, strict, metrics)
+    
+    client = make_client(metrics)
+    decode = flashloan_decoder(strict)
+    
+    print(f"Querying FlashLoan events from block {from_block} to {to_block or 'latest'}...")
+    print(f"  checkpointing to {checkpoint_dir}/{' (resume)' if resume else ''}")
     
+    ranges = await resolve_ranges(client, from_block, to_block, shards)
+    stores = [CheckpointStore(checkpoint_dir, start, end) for start, end in ranges]
+    limiter = asyncio.Semaphore(max(1, concurrency))
+    
+    await asyncio.gather(*(
+        checkpoint_range(client, store, resume, limiter,
+                         f"[shard {i + 1}/{len(stores)}] " if len(stores) > 1 else "", cache_dir, decode, metrics)
+        for i, store in enumerate(stores)
+    ))
+    
+    tables = []
+    for store in stores:
+        rows = store.rows()
+        while chunk := [FlashLoanEvent.from_list(row) for row in itertools.islice(rows, TABLE_ROWS)]:
+            tables.append(events_table(chunk))
+    return concat_events(tables)
+
+
+def decode_flashloan_logs(logs, txs, recipient_topics: list, token_topics: list) -> list[FlashLoanEvent]:
+    """Decode a batch of FlashLoan event logs with loan sizes.
+    
+    The amount / fee data words of the whole batch are decoded and scaled by
+    decimals as NumPy columns; only the event records are built per row.
+    """
     if not logs:
-        print("No flash loans found.")
-        return
+        return []
+    
+    token_ids = REGISTRY.lookup_many(token_topics).tolist()
+    
+    words, _ = hex_words([log.data for log in logs], 2)
+    amounts = scale_by_decimals(words_to_limbs(words[:, 0]), REGISTRY.decimals[token_ids]).tolist()
+    amount_raw = words_to_ints(words[:, 0])
+    fee_raw = words_to_ints(words[:, 1])
+    
+    tx_hashes, _ = hex_words([log.transaction_hash for log in logs], 1)
+    tx_hashes = rows_to_bytes(tx_hashes[:, 0])
+    recipient_words, has_recipient = hex_words(recipient_topics, 1)
+    recipients = rows_to_bytes(recipient_words[:, 0, 12:], has_recipient)
     
     events = []
-    for log in logs:
-        events.append(decode_flashloan_log(log, txs))
-    
-    csv_file = "balancer_flashloans_full.csv"
-    with open(csv_file, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=[
-            "tx_hash", "block", "token", "token_address", 
-            "amount_raw", "amount", "decimals", "fee_raw",
-            "gas_used", "gas_price_gwei", "recipient"
-        ])
-        writer.writeheader()
-        for e in events:
-            writer.writerow(e)
-    
-    print(f"Saved {len(events):,} events to {csv_file}")
-    
-    from collections import defaultdict
-    by_token = defaultdict(list)
-    for e in events:
-        by_token[e["token"]].append(e)
+    for i, log in enumerate(logs):
+        gas_used, gas_price = txs.get(tx_hashes[i]) or (0, 0)
+        events.append(FlashLoanEvent(
+            tx_hashes[i],
+            log.block_number,
+            token_ids[i],
+            amount_raw[i],
+            amounts[i],
+            fee_raw[i],
+            gas_used,
+            gas_price,
+            recipients[i],
+        ))
+    return events
+
+
+def bind_flashloan_decoder(schema: PageSchema | None):
+    """Page decoder specialized for one page shape; None gives the generic one.
+    
+    With all three FlashLoan topics present the topics are indexed directly,
+    and transactions are loaded with the insert for their gas representation.
+    """
+    load_txs = tx_loader(schema)
+    full_topics = schema is not None and schema.topics >= 3
+    
+    def decode(res) -> list[FlashLoanEvent]:
+        logs = res.data.logs or []
+        txs = TxJoinStore()
+        load_txs(txs, res.data.transactions)
+        if full_topics:
+            recipient_topics = [log.topics[1] for log in logs]
+            token_topics = [log.topics[2] for log in logs]
+        else:
+            recipient_topics = [log.topics[1] if len(log.topics) > 1 else None for log in logs]
+            token_topics = [log.topics[2] if len(log.topics) > 2 else None for log in logs]
+        return decode_flashloan_logs(logs, txs, recipient_topics, token_topics)
+    
+    return decode
+
+
+def flashloan_decoder(strict: bool = False) -> SchemaDecoder:
+    """Page decoder bound to the shape of the first non-empty page it sees."""
+    return SchemaDecoder(bind_flashloan_decoder, strict)
+
+
+class RunSummary:
+    """Running totals and quantile sketches behind the end-of-run summary.
+    
+    Per token: moments and amount / gas sketches. Per (token class, loan-size
+    bucket): amount / gas sketches, merged across tokens or buckets as needed.
+    Optionally the heaviest recipients (of some tokens) by count and volume.
+    """
+    
+    def __init__(self, k: int = DEFAULT_K, recipients: RecipientTopK | None = None):
+        self.tokens = Aggregator(["token"])
+        self.quantiles = GroupedQuantiles(["token"], k)
+        self.sizes = GroupedQuantiles(["class", "size"], k)
+        self.recipients = recipients
+    
+    def add_table(self, table):
+        self.tokens.add_table(table)
+        self.quantiles.add_table(table)
+        self.sizes.add_table(table)
+        if self.recipients is not None:
+            self.recipients.add_table(table)
     
+    def to_dict(self) -> dict:
+        d = {"tokens": self.tokens.to_dict(), "quantiles": self.quantiles.to_dict(),
+             "sizes": self.sizes.to_dict()}
+        if self.recipients is not None:
+            d["recipients"] = self.recipients.to_dict()
+        return d
+    
+    @classmethod
+    def from_dict(cls, d: dict) -> RunSummary:
+        summary = cls()
+        summary.tokens = Aggregator.from_dict(d["tokens"])
+        summary.quantiles = GroupedQuantiles.from_dict(d["quantiles"])
+        summary.sizes = GroupedQuantiles.from_dict(d["sizes"])
+        if "recipients" in d:
+            summary.recipients = RecipientTopK.from_dict(d["recipients"])
+        return summary
+    
+    def settings(self) -> dict:
+        """What is tracked, to compare a resumed summary with the command line."""
+        d = {"quantile_k": self.quantiles.k}
+        if self.recipients is not None:
+            d["recipient_capacity"] = self.recipients.by_count.capacity
+            d["recipient_tokens"] = self.recipients.tokens
+        return d
+
+
+def new_summary(args) -> RunSummary:
+    """Empty RunSummary configured by the command line."""
+    recipients = None
+    if args.top_recipients:
+        recipients = RecipientTopK(max(DEFAULT_CAPACITY, 10 * args.top_recipients), args.recipient_token)
+    return RunSummary(args.quantile_k, recipients)
+
+
+def format_percentiles(sketch, fmt: str = ",.2f") -> str:
+    return " / ".join(format(v, fmt) for v in sketch.quantiles(PERCENTILES))
+
+
+PERCENTILE_LABEL = "/".join(f"p{round(q * 100)}" for q in PERCENTILES)
+
+
+def print_summary(summary: RunSummary, top: int = 20):
+    """Per-token summary with percentiles, the stablecoin breakdown and top recipients."""
+    stats = summary.tokens
     print(f"\n{'='*80}")
     print("SUMMARY BY TOKEN")
     print(f"{'='*80}\n")
     
-    for token, token_events in sorted(by_token.items(), key=lambda x: -len(x[1]))[:15]:
-        amounts = [e["amount"] for e in token_events]
-        gas_list = [e["gas_used"] for e in token_events if e["gas_used"] > 0]
-        
-        print(f"{token}: {len(token_events):,} flash loans")
-        print(f"  Loan sizes: min={min(amounts):,.2f}, max={max(amounts):,.2f}, avg={sum(amounts)/len(amounts):,.2f}")
-        if gas_list:
-            print(f"  Gas: min={min(gas_list):,}, max={max(gas_list):,}, avg={sum(gas_list)/len(gas_list):,.0f}")
+    for token, s in stats.items()[:15]:
+        a, g = s.amount, s.gas
+        q = summary.quantiles.groups[token]
+        print(f"{token}: {a.count:,} flash loans")
+        print(f"  Loan sizes: min={a.min:,.2f}, max={a.max:,.2f}, avg={a.avg:,.2f}, std={a.std:,.2f}")
+        print(f"  Loan {PERCENTILE_LABEL}: {format_percentiles(q.amount)}")
+        if g.count:
+            print(f"  Gas: min={g.min:,}, max={g.max:,}, avg={g.avg:,.0f}, std={g.std:,.0f}")
+            print(f"  Gas {PERCENTILE_LABEL}: {format_percentiles(q.gas, ',.0f')}")
         print()
     
-    stables = ["USDC", "USDT", "DAI", "FRAX", "LUSD"]
-    stable_events = [e for e in events if e["token"] in stables]
+    stables = [REGISTRY.symbols[i] for i in REGISTRY.of_class(STABLECOIN)]
+    stable_count = sum(stats.groups[t].count for t in stables if t in stats.groups)
     
     print(f"\n{'='*80}")
-    print(f"STABLECOIN FLASH LOANS: {len(stable_events):,} events")
+    print(f"STABLECOIN FLASH LOANS: {stable_count:,} events")
     print(f"{'='*80}\n")
     
     for token in stables:
-        token_events = [e for e in stable_events if e["token"] == token]
-        if not token_events:
+        s = stats.groups.get(token)
+        if not s:
             continue
-        amounts = [e["amount"] for e in token_events]
-        gas_list = [e["gas_used"] for e in token_events if e["gas_used"] > 0]
         
-        print(f"{token}: {len(token_events):,} loans")
-        print(f"  Total volume: ${sum(amounts):,.0f}")
-        print(f"  Avg loan: ${sum(amounts)/len(amounts):,.0f}")
-        print(f"  Max loan: ${max(amounts):,.0f}")
-        if gas_list:
-            print(f"  Avg gas: {sum(gas_list)/len(gas_list):,.0f}")
+        print(f"{token}: {s.count:,} loans")
+        print(f"  Total volume: ${s.amount.sum:,.0f}")
+        print(f"  Avg loan: ${s.amount.avg:,.0f}")
+        print(f"  Median loan: ${summary.quantiles.groups[token].amount.quantile(0.5):,.0f}")
+        print(f"  Max loan: ${s.amount.max:,.0f}")
+        if s.gas.count:
+            print(f"  Avg gas: {s.gas.avg:,.0f}")
         print()
+    
+    stable = CLASS_NAMES[STABLECOIN]
+    buckets = [(label, summary.sizes.groups[(stable, label)]) for label in SIZE_LABELS
+               if (stable, label) in summary.sizes.groups]
+    if buckets:
+        print(f"Stablecoin gas by loan size ({PERCENTILE_LABEL}):")
+        for label, q in buckets:
+            gas = format_percentiles(q.gas, ",.0f") if q.gas.n else "-"
+            print(f"  {label:<14} {q.amount.n:>10,} loans  gas {gas}")
+        print()
+    
+    if summary.recipients is not None:
+        print_top_recipients(summary.recipients, top)
+
+
+def print_top_recipients(recipients: RecipientTopK, n: int):
+    """Heaviest recipients by count (and by volume when filtered to some tokens)."""
+    which = ", ".join(recipients.tokens) if recipients.tokens else "all tokens"
+    print(f"\n{'='*80}")
+    print(f"TOP RECIPIENTS ({which})")
+    print(f"{'='*80}\n")
+    
+    rankings = [("count", "loans", ",.0f")]
+    if recipients.tokens:
+        rankings.append(("volume", "volume", ",.2f"))
+    for by, unit, fmt in rankings:
+        total = recipients.by_count.total if by == "count" else recipients.by_volume.total
+        print(f"By {by} (estimate, at most this much over):")
+        for address, estimate, error in recipients.top(n, by):
+            share = 100 * estimate / total if total else 0
+            print(f"  {address}  {format(estimate, fmt):>24} {unit}  ({share:.1f}%, +{format(error, fmt)})")
+        print()
+
+
+async def stream_to_csv(
+    from_block: int,
+    to_block: int | None,
+    csv_file: str,
+    prefetch: int = 2,
+    cache_dir: str | None = None,
+    strict: bool = False,
+    metrics: RunMetrics | None = None,
+    append: bool = False,
+    store: EventStore | None = None,
+    snapshot: SnapshotWriter | None = None,
+    rollups: RollupWriter | None = None,
+    stats: RunSummary | None = None,
+):
+    """Decode and write each page as it arrives, keeping only running totals in memory.
+    
+    Fetch, decode and write run as an overlapped pipeline: the next page is
+    requested while the current one is decoded and written. With append=True
+    rows are added to an existing CSV under its header. With a store, a
+    snapshot or rollups every page is also loaded into / appended to it.
+    """
+    client = make_client(metrics)
+    
+    print(f"Streaming FlashLoan events from block {from_block} to {to_block or 'latest'}...")
+    
+    stats = stats or RunSummary()
+    count = 0
+    if store is not None:
+        store.start(from_block)
+    if rollups is not None:
+        rollups.start(from_block)
+    with CsvSink(csv_file, append=append) as out:
+        
+        def sink(res, rows):
+            nonlocal count
+            table = events_table(rows) if rows else None
+            out.write(table)
+            if store is not None:
+                store.load_page(table, res.next_block)
+            if snapshot is not None:
+                snapshot.write(table)
+            if rollups is not None:
+                rollups.load_page(table, res.next_block)
+            stats.add_table(table)
+            count += len(rows)
+            print_progress("", count, from_block, to_block, res)
+        
+        timing = await run_pipeline(
+            open_pages(client, from_block, to_block, cache_dir=cache_dir),
+            flashloan_decoder(strict),
+            sink,
+            prefetch=prefetch,
+            metrics=metrics,
+            from_block=from_block,
+        )
+    
+    print(f"  Pipeline: {timing.report()}")
+    print(f"  Requests: {client.report()}")
+    return count, stats
+
+
+async def stream_to_parquet(
+    from_block: int,
+    to_block: int | None,
+    root: str,
+    window: int = DEFAULT_WINDOW,
+    prefetch: int = 2,
+    cache_dir: str | None = None,
+    strict: bool = False,
+    metrics: RunMetrics | None = None,
+    store: EventStore | None = None,
+    snapshot: SnapshotWriter | None = None,
+    rollups: RollupWriter | None = None,
+    stats: RunSummary | None = None,
+):
+    """stream_to_csv into a token / block-window partitioned Parquet dataset.
+    
+    Only the current block window is held in memory; each window is written
+    once the stream has moved past it.
+    """
+    client = make_client(metrics)
+    
+    print(f"Streaming FlashLoan events from block {from_block} to {to_block or 'latest'}...")
+    
+    stats = stats or RunSummary()
+    count = 0
+    dataset = PartitionedParquetSink(root, window, from_block=from_block, to_block=to_block)
+    if store is not None:
+        store.start(from_block)
+    if rollups is not None:
+        rollups.start(from_block)
+    
+    def sink(res, rows):
+        nonlocal count
+        table = events_table(rows) if rows else None
+        dataset.write(table)
+        if store is not None:
+            store.load_page(table, res.next_block)
+        if snapshot is not None:
+            snapshot.write(table)
+        if rollups is not None:
+            rollups.load_page(table, res.next_block)
+        stats.add_table(table)
+        count += len(rows)
+        print_progress("", count, from_block, to_block, res)
+    
+    timing = await run_pipeline(
+        open_pages(client, from_block, to_block, cache_dir=cache_dir),
+        flashloan_decoder(strict),
+        sink,
+        prefetch=prefetch,
+        metrics=metrics,
+        from_block=from_block,
+    )
+    t0 = time.perf_counter()
+    dataset.close()
+    if metrics is not None:
+        metrics.record_write(time.perf_counter() - t0)
+    
+    print(f"  Pipeline: {timing.report()}")
+    print(f"  Requests: {client.report()}")
+    print(f"  Wrote {dataset.files} files under {root}/")
+    return count, stats
+
+
+def open_parquet_dataset(args) -> PartitionedParquetSink | None:
+    """--parquet-dir sink of a batch run, checked against the dataset before anything is fetched."""
+    if not args.parquet_dir:
+        return None
+    return PartitionedParquetSink(args.parquet_dir, args.window, from_block=args.from_block, to_block=args.to_block)
+
+
+def save_parquet_dataset(table, sink: PartitionedParquetSink, metrics: RunMetrics | None = None):
+    """Write a whole event table covering the sink's run range into its partitioned dataset."""
+    t0 = time.perf_counter()
+    sink.write(table)
+    sink.close()
+    if metrics is not None:
+        metrics.record_write(time.perf_counter() - t0)
+    print(f"Saved {sink.rows:,} events to {sink.root}/ ({sink.files} files)")
+
+
+def save_csv(table, path: str, append: bool = False, metrics: RunMetrics | None = None):
+    """Write a whole event table as CSV (appending under the existing header with append)."""
+    t0 = time.perf_counter()
+    with CsvSink(path, append=append) as out:
+        out.write(table)
+    if metrics is not None:
+        metrics.record_write(time.perf_counter() - t0)
+    print(f"Saved {out.rows:,} events to {path}{' (appended)' if append else ''}")
+
+
+def save_snapshot(table, path: str, from_block: int, to_block: int | None, metrics: RunMetrics | None = None):
+    """Write an event table as a memory-mapped snapshot directory."""
+    t0 = time.perf_counter()
+    rows = write_snapshot(table, path, {"from_block": from_block, "to_block": to_block})
+    if metrics is not None:
+        metrics.record_write(time.perf_counter() - t0)
+    print(f"Saved {rows:,} events to snapshot {path}/")
+
+
+def save_to_store(table, path: str, from_block: int, to_block: int | None, metrics: RunMetrics | None = None):
+    """Load an event table into the SQLite store at path, replacing [from_block, to_block)."""
+    t0 = time.perf_counter()
+    store = EventStore(path)
+    rows = store.replace_range(table, from_block, to_block)
+    store.close()
+    if metrics is not None:
+        metrics.record_write(time.perf_counter() - t0)
+    print(f"Loaded {rows:,} events into {path}")
+
+
+def save_rollups(table, root: str, from_block: int, to_block: int, window: int, quantile_k: int):
+    """Fold an event table covering [from_block, to_block) into the per-window rollups under root."""
+    windows = write_rollups(table, root, from_block, to_block, window, quantile_k)
+    print(f"Updated {windows} rollup windows in {root}/")
+
+
+def rollup_dir(args) -> str:
+    """Rollups live next to the main output: inside a Parquet dataset, else beside the file."""
+    if args.parquet_dir:
+        return os.path.join(args.parquet_dir, "_rollups")
+    return (args.csv_file or PARQUET_FILE) + ".rollups"
+
+
+def save_report(table, path: str):
+    """Write the BALANCER_COMPARISON.md statistics tables for an event table."""
+    with open(path, "w") as f:
+        f.write(render_markdown(render_tables(compute_report(table))))
+    print(f"Saved report to {path}")
+
+
+async def follow_to_csv(
+    from_block: int,
+    csv_file: str,
+    confirmations: int,
+    poll_interval: float,
+    prefetch: int = 2,
+    strict: bool = False,
+    metrics: RunMetrics | None = None,
+    store: EventStore | None = None,
+    stats: RunSummary | None = None,
+    top: int = 20,
+):
+    """Catch up to the chain head and keep appending new FlashLoan events.
+    
+    Each page is flushed to the CSV and committed to a sidecar state file
+    together with the running totals and quantile sketches, so a restart resumes the
+    file and the summary without re-reading history. With a store each page
+    is loaded into it before the state is committed.
+    """
+    state = OutputCheckpoint(csv_file)
+    
+    stats = stats or RunSummary()
+    count = 0
+    resumed = state.load()
+    if not resumed and os.path.exists(csv_file) and os.path.getsize(csv_file) > 0:
+        # without the sidecar there is no telling which blocks the file covers
+        raise SystemExit(f"{csv_file} exists but has no {state.state_path}; not overwriting it. "
+                         "Move it away or pick another --csv-file to follow.")
+    if resumed:
+        state.truncate_output()
+        from_block = state.next_block
+        count = state.extra["events"]
+        saved = RunSummary.from_dict(state.extra["summary"])
+        if saved.settings() != stats.settings():
+            print(f"[WARN] {state.state_path} tracks {saved.settings()}; resuming with that, "
+                  f"not {stats.settings()} from the command line")
+        stats = saved
+        print(f"Following from block {from_block:,}, appending to {csv_file} ({count:,} events so far)")
+    else:
+        print(f"Following from block {from_block:,}, writing {csv_file}")
+    print(f"  {confirmations} confirmations, polling every {poll_interval}s")
+    
+    client = make_client(metrics)
+    if store is not None:
+        store.start(from_block)
+    with CsvSink(csv_file, append=resumed) as out:
+        
+        def sink(res, rows):
+            nonlocal count
+            table = events_table(rows) if rows else None
+            out.write(table)
+            out.flush(sync=True)
+            if store is not None:
+                store.load_page(table, res.next_block)
+            stats.add_table(table)
+            count += len(rows)
+            state.commit(res.next_block, out.tell(), {
+                "events": count,
+                "summary": stats.to_dict(),
+            })
+            print(f"  {count:,} events (+{len(rows)}) | block {res.next_block:,} | head {res.archive_height:,}")
+        
+        query = build_query(from_block)
+        try:
+            await run_pipeline(
+                follow_pages(client, query, confirmations, poll_interval),
+                flashloan_decoder(strict),
+                sink,
+                prefetch=prefetch,
+                metrics=metrics,
+                from_block=from_block,
+            )
+        finally:
+            print_summary(stats, top)
+
+
+async def extract_arrow(
+    from_block: int,
+    to_block: int | None,
+    prefetch: int = 2,
+    workers: int = 0,
+    metrics: RunMetrics | None = None,
+):
+    """Fetch Arrow pages and decode them column-wise into one event table.
+    
+    With workers > 0 pages are decoded in a process pool: each worker gets
+    the page's Arrow tables and sends the decoded table back, and tables are
+    collected in page order.
+    """
+    client = make_client(metrics)
+    
+    print(f"Fetching FlashLoan events (Arrow) from block {from_block} to {to_block or 'latest'}...")
+    
+    tables = []
+    count = 0
+    
+    def sink(res, table):
+        nonlocal count
+        if table is not None:
+            tables.append(table)
+            count += table.num_rows
+        print_progress("", count, from_block, to_block, res)
+    
+    query = build_query(from_block, to_block)
+    pages = iter_pages(client, query, to_block, arrow=True)
+    if workers > 0:
+        print(f"  decoding in {workers} worker processes")
+        with ProcessPoolExecutor(workers) as pool:
+            timing = await run_pipeline(detach_pages(pages), decode_flashloan_page, sink,
+                                        max(prefetch, workers), metrics, pool, from_block)
+    else:
+        timing = await run_pipeline(pages, decode_flashloan_page, sink, prefetch, metrics, from_block=from_block)
+    print(f"  Pipeline: {timing.report()}")
+    print(f"  Requests: {client.report()}")
+    
+    return concat_events(tables)
+
+
+async def detach_pages(pages):
+    """Keep only the logs / transactions tables of each page, so it pickles cheaply."""
+    async for res in pages:
+        yield CachedPage(res.next_block, res.archive_height, res.data.logs, res.data.transactions)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract Balancer V2 FlashLoan events")
+    parser.add_argument("--from-block", type=int, default=19000000)
+    parser.add_argument("--to-block", type=int, default=None,
+                        help="end block, exclusive (default 21000000; ignored with --follow)")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="split the range into N concurrently fetched sub-ranges")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="max HyperSync requests in flight when sharding")
+    parser.add_argument("--checkpoint-dir", default=None,
+                        help="commit decoded pages to this directory as they arrive")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue from the last checkpointed block (same range and --shards)")
+    parser.add_argument("--stream", action="store_true",
+                        help="decode and write each page as it arrives instead of holding all events")
+    parser.add_argument("--prefetch", type=int, default=2,
+                        help="pages buffered between fetch, decode and write stages (--stream, --arrow)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="decode --arrow pages in N worker processes (default: in a thread)")
+    parser.add_argument("--follow", action="store_true",
+                        help="after catching up, keep tailing new blocks and appending to the CSV")
+    parser.add_argument("--confirmations", type=int, default=12,
+                        help="blocks behind the head to stay with --follow, so reorgs are never written")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="seconds between head checks once caught up (--follow)")
+    parser.add_argument("--arrow", action="store_true",
+                        help="ingest Arrow responses and decode whole columns; writes Parquet")
+    parser.add_argument("--csv-file", default=None, metavar="PATH",
+                        help=f"CSV output (default {CSV_FILE}); .gz / .zst are compressed. With --arrow, also write this CSV")
+    parser.add_argument("--append", action="store_true",
+                        help="add rows to an existing CSV under its header instead of overwriting it")
+    parser.add_argument("--db", default=None, metavar="PATH",
+                        help="also load the events into this SQLite store (query it with event_store.py)")
+    parser.add_argument("--snapshot", default=None, metavar="DIR",
+                        help="also write a memory-mapped column snapshot (open it with snapshot.Snapshot)")
+    parser.add_argument("--parquet-dir", default=None, metavar="DIR",
+                        help="write a Parquet dataset partitioned by token and block window instead of the CSV / Parquet file")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW,
+                        help="blocks per --parquet-dir partition")
+    parser.add_argument("--rollups", action="store_true",
+                        help="keep per-block-window aggregates next to the output (query them with rollups.py)")
+    parser.add_argument("--rollup-window", type=int, default=None,
+                        help="blocks per rollup window (default: --window)")
+    parser.add_argument("--report", default=None, metavar="PATH",
+                        help="write the BALANCER_COMPARISON.md statistics tables as Markdown (see report.py)")
+    parser.add_argument("--top-recipients", type=int, default=0, metavar="N",
+                        help="also track and print the N heaviest recipients by loan count (and volume)")
+    parser.add_argument("--recipient-token", action="append", default=None, metavar="SYMBOL",
+                        help="only count loans of this token for --top-recipients (repeatable); enables the volume ranking")
+    parser.add_argument("--quantile-error", type=float, default=None, metavar="EPS",
+                        help=f"rank error of the summary percentiles, as a fraction (default {1.65 / DEFAULT_K:.4f})")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="local Parquet cache of HyperSync responses")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always fetch from HyperSync, bypassing the local cache")
+    parser.add_argument("--metrics-json", default=None, metavar="PATH",
+                        help="write a JSON run report (request latency, decode/write time, events/s)")
+    parser.add_argument("--metrics-prom", default=None, metavar="PATH",
+                        help="write the run metrics as a Prometheus text-format file")
+    parser.add_argument("--strict-schema", action="store_true",
+                        help="fail if a page's shape differs from the first page's instead of decoding it generically")
+    args = parser.parse_args()
+    if args.to_block is None and not args.follow:
+        args.to_block = 21000000
+    if args.follow and (args.stream or args.arrow or args.shards > 1 or args.checkpoint_dir or args.resume):
+        parser.error("--follow cannot be combined with --stream, --arrow, --shards, --checkpoint-dir or --resume")
+    if args.no_cache:
+        args.cache_dir = None
+    if args.stream and (args.shards > 1 or args.checkpoint_dir or args.resume):
+        parser.error("--stream cannot be combined with --shards, --checkpoint-dir or --resume")
+    if args.follow and (args.parquet_dir or args.snapshot or args.report or args.rollups):
+        parser.error("--parquet-dir, --snapshot, --report and --rollups cannot be combined with --follow")
+    if args.append and (args.follow or args.parquet_dir):
+        parser.error("--append cannot be combined with --follow (which always resumes its CSV) or --parquet-dir")
+    if args.follow and args.csv_file and args.csv_file.endswith((".gz", ".zst")):
+        parser.error("--follow needs an uncompressed --csv-file")
+    if args.csv_file is None and not args.arrow:
+        args.csv_file = CSV_FILE
+    if args.window < 1:
+        parser.error("--window must be at least 1")
+    if args.rollup_window is None:
+        args.rollup_window = args.window
+    if args.rollup_window < 1:
+        parser.error("--rollup-window must be at least 1")
+    if args.quantile_error is not None and not 0 < args.quantile_error < 1:
+        parser.error("--quantile-error must be between 0 and 1")
+    args.quantile_k = k_for_error(args.quantile_error) if args.quantile_error else DEFAULT_K
+    if args.recipient_token and not args.top_recipients:
+        parser.error("--recipient-token requires --top-recipients")
+    unknown = sorted(set(args.recipient_token or ()) - set(REGISTRY.symbols))
+    if unknown:
+        parser.error(f"unknown --recipient-token {', '.join(unknown)} (known: {', '.join(REGISTRY.symbols[1:])})")
+    if args.workers and not args.arrow:
+        parser.error("--workers requires --arrow")
+    if args.arrow and (args.stream or args.shards > 1 or args.checkpoint_dir or args.resume):
+        parser.error("--arrow cannot be combined with --stream, --shards, --checkpoint-dir or --resume")
+    return args
+
+
+def run_name(args) -> str:
+    mode = "follow" if args.follow else "arrow" if args.arrow else "stream" if args.stream else "batch"
+    return f"{mode}-{args.from_block}-{args.to_block if args.to_block is not None else 'head'}"
+
+
+async def main():
+    args = parse_args()
+    metrics = RunMetrics(run_name(args)) if args.metrics_json or args.metrics_prom else None
+    try:
+        await run(args, metrics)
+    finally:
+        if metrics is not None:
+            metrics.finish()
+            print(f"Metrics: {metrics.report()}")
+            if args.metrics_json:
+                metrics.write_json(args.metrics_json)
+                print(f"Saved run report to {args.metrics_json}")
+            if args.metrics_prom:
+                metrics.write_prometheus(args.metrics_prom)
+                print(f"Saved Prometheus metrics to {args.metrics_prom}")
+
+
+async def run(args, metrics: RunMetrics | None):
+    if args.follow:
+        store = EventStore(args.db) if args.db else None
+        try:
+            await follow_to_csv(args.from_block, args.csv_file, args.confirmations,
+                                args.poll_interval, prefetch=args.prefetch,
+                                strict=args.strict_schema, metrics=metrics, store=store,
+                                stats=new_summary(args), top=args.top_recipients or 20)
+        finally:
+            if store is not None:
+                store.close()
+        return
+    
+    if args.rollups:
+        check_rollups(rollup_dir(args), args.rollup_window, args.quantile_k)
+    if args.arrow:
+        dataset = open_parquet_dataset(args)
+        table = await extract_arrow(args.from_block, args.to_block, prefetch=args.prefetch,
+                                    workers=args.workers, metrics=metrics)
+        count = table.num_rows if table is not None else 0
+        
+        print(f"\n{'='*80}")
+        print(f"Found {count:,} FlashLoan events")
+        print(f"{'='*80}\n")
+        
+        if not count:
+            print("No flash loans found.")
+            return
+        
+        if args.parquet_dir:
+            save_parquet_dataset(table, dataset, metrics)
+        else:
+            t0 = time.perf_counter()
+            pq.write_table(table, PARQUET_FILE, compression="zstd")
+            if metrics is not None:
+                metrics.record_write(time.perf_counter() - t0)
+            print(f"Saved {count:,} events to {PARQUET_FILE}")
+        if args.csv_file:
+            save_csv(table, args.csv_file, args.append, metrics)
+        if args.db:
+            save_to_store(table, args.db, args.from_block, args.to_block, metrics)
+        if args.snapshot:
+            save_snapshot(table, args.snapshot, args.from_block, args.to_block, metrics)
+        if args.rollups:
+            save_rollups(table, rollup_dir(args), args.from_block, args.to_block, args.rollup_window, args.quantile_k)
+        if args.report:
+            save_report(table, args.report)
+        stats = new_summary(args)
+        stats.add_table(table)
+        print_summary(stats, args.top_recipients)
+        return
+    
+    if args.stream:
+        store = EventStore(args.db) if args.db else None
+        snapshot = None
+        if args.snapshot:
+            snapshot = SnapshotWriter(args.snapshot, {"from_block": args.from_block, "to_block": args.to_block})
+        rollups = RollupWriter(rollup_dir(args), args.rollup_window, args.quantile_k) if args.rollups else None
+        try:
+            if args.parquet_dir:
+                count, stats = await stream_to_parquet(
+                    args.from_block, args.to_block, args.parquet_dir, args.window,
+                    prefetch=args.prefetch, cache_dir=args.cache_dir,
+                    strict=args.strict_schema, metrics=metrics, store=store, snapshot=snapshot,
+                    stats=new_summary(args), rollups=rollups)
+            else:
+                count, stats = await stream_to_csv(
+                    args.from_block, args.to_block, args.csv_file,
+                    prefetch=args.prefetch, cache_dir=args.cache_dir,
+                    strict=args.strict_schema, metrics=metrics, append=args.append,
+                    store=store, snapshot=snapshot, stats=new_summary(args), rollups=rollups)
+        finally:
+            if store is not None:
+                store.close()
+        if snapshot is not None:
+            snapshot.close()
+        if rollups is not None:
+            rollups.close()
+        
+        print(f"\n{'='*80}")
+        print(f"Found {count:,} FlashLoan events")
+        print(f"{'='*80}\n")
+        
+        if not count:
+            print("No flash loans found.")
+            return
+        
+        if not args.parquet_dir:
+            print(f"Saved {count:,} events to {args.csv_file}")
+        if args.db:
+            print(f"Loaded {count:,} events into {args.db}")
+        if args.snapshot:
+            print(f"Saved {count:,} events to snapshot {args.snapshot}/")
+        if rollups is not None:
+            print(f"Updated {rollups.written} rollup windows in {rollups.root}/")
+        if args.report:
+            save_report(load_events(args.snapshot or args.parquet_dir or args.csv_file), args.report)
+        print_summary(stats, args.top_recipients)
+        return
+    
+    checkpoint_dir = args.checkpoint_dir
+    if args.resume and checkpoint_dir is None:
+        checkpoint_dir = DEFAULT_CHECKPOINT_DIR
+    
+    dataset = open_parquet_dataset(args)
+    table = await extract_flashloans(
+        args.from_block, args.to_block,
+        shards=args.shards, concurrency=args.concurrency,
+        checkpoint_dir=checkpoint_dir, resume=args.resume,
+        cache_dir=args.cache_dir,
+        strict=args.strict_schema,
+        metrics=metrics,
+    )
+    count = table.num_rows if table is not None else 0
+    
+    print(f"\n{'='*80}")
+    print(f"Found {count:,} FlashLoan events")
+    print(f"{'='*80}\n")
+    
+    if not count:
+        print("No flash loans found.")
+        return
+    
+    if args.parquet_dir:
+        save_parquet_dataset(table, dataset, metrics)
+    else:
+        save_csv(table, args.csv_file, args.append, metrics)
+    if args.db:
+        save_to_store(table, args.db, args.from_block, args.to_block, metrics)
+    if args.snapshot:
+        save_snapshot(table, args.snapshot, args.from_block, args.to_block, metrics)
+    if args.rollups:
+        save_rollups(table, rollup_dir(args), args.from_block, args.to_block, args.rollup_window, args.quantile_k)
+    if args.report:
+        save_report(table, args.report)
+    
+    stats = new_summary(args)
+    stats.add_table(table)
+    print_summary(stats, args.top_recipients)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,238 @@
+"""
+Bounded-memory top-K of flash-loan recipients by loan count and by volume.
+
+SpaceSaving (Metwally et al. 2005) keeps at most `capacity` counters; a
+recipient that is not tracked has a count of at most the smallest tracked
+one, so every recipient with more than total / capacity loans (or volume)
+is guaranteed to be in the table. Each counter carries its maximum
+overestimate, so count - error is a guaranteed lower bound. A page is
+reduced to exact per-recipient sums first, then merged into the counters
+with the mergeable Space-Saving rule, so updating from a page and merging
+two trackers (shards, resumed runs) are the same operation.
+
+A CountMinSketch answers "how many loans / how much volume did this
+address take" for any recipient, tracked or not, never underestimating;
+it also merges by addition.
+
+  top = RecipientTopK(tokens=["USDC"])
+  top.add_table(table)
+  for address, volume, error in top.top(20, by="volume"): ...
+
+Volume is the decimals-scaled amount, so only tokens of one unit (e.g. the
+stablecoins) should share a tracker's volume ranking.
+
+Requires: pip install numpy pyarrow
+"""
+from __future__ import annotations
+import base64
+
+import numpy as np
+import pyarrow as pa
+
+from columnar import fixed_matrix, valid_mask
+from tokens import REGISTRY
+
+KEY_BYTES = 20
+DEFAULT_CAPACITY = 1000
+DEFAULT_WIDTH = 2048
+DEFAULT_DEPTH = 4
+
+
+def _encode(values: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(values).tobytes()).decode()
+
+
+def _decode(text: str, dtype) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(text), dtype=dtype).copy()
+
+
+def _unique_rows(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Distinct 20-byte rows and each row's index among them (a void view sorts fast)."""
+    rows = np.ascontiguousarray(keys).view(f"V{KEY_BYTES}").reshape(-1)
+    unique, inverse = np.unique(rows, return_inverse=True)
+    return unique.view(np.uint8).reshape(-1, KEY_BYTES), inverse.reshape(-1)
+
+
+class SpaceSaving:
+    """Approximate heaviest keys (20-byte rows) of a weighted stream."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.keys = np.empty((0, KEY_BYTES), dtype=np.uint8)
+        self.counts = np.empty(0)
+        self.errors = np.empty(0)
+        self.total = 0.0
+
+    @property
+    def floor(self) -> float:
+        """Upper bound on the count of any key that is not tracked."""
+        return float(self.counts.min()) if len(self.counts) >= self.capacity else 0.0
+
+    def update(self, keys: np.ndarray, weights: np.ndarray | None = None):
+        """Add a batch of (n, 20) uint8 keys, each with weight 1 or its weight."""
+        if not len(keys):
+            return
+        unique, inverse = _unique_rows(keys)
+        sums = np.bincount(inverse, weights=weights, minlength=len(unique)).astype(np.float64)
+        self._merge(unique, sums, np.zeros(len(unique)), 0.0, float(sums.sum()))
+
+    def merge(self, other: SpaceSaving):
+        self._merge(other.keys, other.counts, other.errors, other.floor, other.total)
+
+    def _merge(self, keys, counts, errors, floor: float, total: float):
+        # a key missing from one side counts as that side's floor, which is
+        # both its possible count there and its possible overestimate
+        own_floor = self.floor
+        union, inverse = _unique_rows(np.concatenate([self.keys, keys]))
+        mine, theirs = inverse[:len(self.keys)], inverse[len(self.keys):]
+        merged = np.full(len(union), own_floor + floor)
+        error = merged.copy()
+        merged[mine] += self.counts - own_floor
+        error[mine] += self.errors - own_floor
+        merged[theirs] += counts - floor
+        error[theirs] += errors - floor
+        keep = np.argsort(-merged, kind="stable")[:self.capacity]
+        self.keys, self.counts, self.errors = union[keep], merged[keep], error[keep]
+        self.total += total
+
+    def top(self, n: int) -> list[tuple[bytes, float, float]]:
+        """(key, estimated count, maximum overestimate) of the n heaviest keys."""
+        order = np.argsort(-self.counts, kind="stable")[:n]
+        return [(self.keys[i].tobytes(), float(self.counts[i]), float(self.errors[i])) for i in order]
+
+    def to_dict(self) -> dict:
+        return {"capacity": self.capacity, "total": self.total, "keys": _encode(self.keys),
+                "counts": _encode(self.counts), "errors": _encode(self.errors)}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> SpaceSaving:
+        ss = cls(d["capacity"])
+        ss.total = d["total"]
+        ss.keys = _decode(d["keys"], np.uint8).reshape(-1, KEY_BYTES)
+        ss.counts = _decode(d["counts"], np.float64)
+        ss.errors = _decode(d["errors"], np.float64)
+        return ss
+
+
+def _key_hash(keys: np.ndarray) -> np.ndarray:
+    """64-bit value per 20-byte key, folding all of its bytes."""
+    words = np.ascontiguousarray(keys[:, :16]).view("<u8")
+    tail = np.ascontiguousarray(keys[:, 16:]).view("<u4").astype(np.uint64)
+    return words[:, 0] ^ words[:, 1] ^ (tail[:, 0] << np.uint64(17))
+
+
+class CountMinSketch:
+    """Never-underestimating point queries of per-key weight sums."""
+
+    def __init__(self, width: int = DEFAULT_WIDTH, depth: int = DEFAULT_DEPTH, seed: int = 0):
+        if width & (width - 1):
+            raise ValueError("width must be a power of two")
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 2**63, depth, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 2**63, depth, dtype=np.uint64)
+        self._shift = np.uint64(64 - width.bit_length() + 1)
+        self.table = np.zeros((depth, width))
+
+    def _buckets(self, keys: np.ndarray) -> np.ndarray:
+        """(depth, n) bucket of each key in each row (multiply-shift hashing)."""
+        x = _key_hash(keys)
+        with np.errstate(over="ignore"):
+            return ((self._a[:, None] * x[None, :] + self._b[:, None]) >> self._shift).astype(np.intp)
+
+    def update(self, keys: np.ndarray, weights: np.ndarray | None = None):
+        if not len(keys):
+            return
+        for row, buckets in enumerate(self._buckets(keys)):
+            self.table[row] += np.bincount(buckets, weights=weights, minlength=self.width)
+
+    def estimate(self, keys: np.ndarray) -> np.ndarray:
+        buckets = self._buckets(keys)
+        return self.table[np.arange(self.depth)[:, None], buckets].min(axis=0)
+
+    def merge(self, other: CountMinSketch):
+        if (other.width, other.depth, other.seed) != (self.width, self.depth, self.seed):
+            raise ValueError("only sketches with the same width, depth and seed merge")
+        self.table += other.table
+
+    def to_dict(self) -> dict:
+        return {"width": self.width, "depth": self.depth, "seed": self.seed, "table": _encode(self.table)}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> CountMinSketch:
+        cm = cls(d["width"], d["depth"], d["seed"])
+        cm.table = _decode(d["table"], np.float64).reshape(cm.depth, cm.width)
+        return cm
+
+
+def address_keys(addresses) -> np.ndarray:
+    """(n, 20) uint8 keys from hex strings or bytes."""
+    raw = [bytes.fromhex(a[2:] if a.startswith("0x") else a) if isinstance(a, str) else bytes(a) for a in addresses]
+    return np.frombuffer(b"".join(raw), dtype=np.uint8).reshape(-1, KEY_BYTES)
+
+
+class RecipientTopK:
+    """Heaviest recipients by loan count and by volume, optionally for some tokens only."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, tokens=None,
+                 width: int = DEFAULT_WIDTH, depth: int = DEFAULT_DEPTH):
+        unknown = sorted(set(tokens or ()) - set(REGISTRY.symbols))
+        if unknown:
+            raise ValueError(f"unknown token symbols {unknown} (known: {', '.join(REGISTRY.symbols[1:])})")
+        self.tokens = sorted(tokens) if tokens else None
+        self.by_count = SpaceSaving(capacity)
+        self.by_volume = SpaceSaving(capacity)
+        self.counts = CountMinSketch(width, depth)
+        self.volumes = CountMinSketch(width, depth)
+
+    def add_table(self, table: pa.Table | None):
+        """Add one decoded event table (columns as decode_flashloan_table)."""
+        if table is None or table.num_rows == 0:
+            return
+        keys = fixed_matrix(table.column("recipient"))
+        amount = table.column("amount").to_numpy()
+        # events without a recipient topic are not anyone's loans
+        keep = valid_mask(table.column("recipient"))
+        if self.tokens is not None:
+            token = table.column("token").combine_chunks()
+            wanted = [i for i, s in enumerate(token.dictionary.to_pylist()) if s in self.tokens]
+            keep &= np.isin(token.indices.to_numpy(zero_copy_only=False), wanted)
+        if not keep.all():
+            keys, amount = keys[keep], amount[keep]
+        self.by_count.update(keys)
+        self.by_volume.update(keys, amount)
+        self.counts.update(keys)
+        self.volumes.update(keys, amount)
+
+    def merge(self, other: RecipientTopK):
+        if other.tokens != self.tokens:
+            raise ValueError(f"cannot merge recipients of {other.tokens} into {self.tokens}")
+        self.by_count.merge(other.by_count)
+        self.by_volume.merge(other.by_volume)
+        self.counts.merge(other.counts)
+        self.volumes.merge(other.volumes)
+
+    def top(self, n: int = 20, by: str = "count") -> list[tuple[str, float, float]]:
+        """("0x..." address, estimate, maximum overestimate) of the n heaviest recipients."""
+        ss = self.by_volume if by == "volume" else self.by_count
+        return [("0x" + key.hex(), count, error) for key, count, error in ss.top(n)]
+
+    def estimate(self, addresses) -> tuple[np.ndarray, np.ndarray]:
+        """Upper-bound loan counts and volumes of any addresses."""
+        keys = address_keys(addresses)
+        return self.counts.estimate(keys), self.volumes.estimate(keys)
+
+    def to_dict(self) -> dict:
+        return {"tokens": self.tokens, "by_count": self.by_count.to_dict(), "by_volume": self.by_volume.to_dict(),
+                "counts": self.counts.to_dict(), "volumes": self.volumes.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> RecipientTopK:
+        top = cls(tokens=d["tokens"])
+        top.by_count = SpaceSaving.from_dict(d["by_count"])
+        top.by_volume = SpaceSaving.from_dict(d["by_volume"])
+        top.counts = CountMinSketch.from_dict(d["counts"])
+        top.volumes = CountMinSketch.from_dict(d["volumes"])
+        return top
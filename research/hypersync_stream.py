@@ -0,0 +1,73 @@
+"""
+Page-at-a-time HyperSync iteration shared by the research scripts.
+
+Instead of collecting every log and transaction for a range before decoding,
+callers get one response page at a time, decode it against that page's own
+transactions (JOIN_ALL returns a log's transaction in the same page) and can
+drop the raw hypersync objects before the next page arrives.
+
+Requires: pip install hypersync
+"""
+from __future__ import annotations
+import asyncio
+import dataclasses
+from typing import AsyncIterator, Callable
+
+import hypersync
+
+
+async def iter_pages(
+    client: hypersync.HypersyncClient,
+    query: hypersync.Query,
+    to_block: int | None,
+    limiter: asyncio.Semaphore | None = None,
+    arrow: bool = False,
+):
+    """Yield responses for `query` page by page until to_block (or archive height).
+
+    With arrow=True pages come from get_arrow, with pyarrow tables as data.
+    """
+    get = client.get_arrow if arrow else client.get
+    while True:
+        if limiter is None:
+            res = await get(query)
+        else:
+            async with limiter:
+                res = await get(query)
+
+        yield res
+
+        if res.next_block >= (to_block or res.archive_height):
+            break
+
+        query.from_block = res.next_block
+
+
+async def stream_decoded(pages: AsyncIterator, decode: Callable):
+    """Yield (response, decoded rows) per page; decode(res) decodes one whole page."""
+    async for res in pages:
+        yield res, decode(res)
+
+
+async def follow_pages(
+    client: hypersync.HypersyncClient,
+    query: hypersync.Query,
+    confirmations: int,
+    poll_interval: float = 2.0,
+    arrow: bool = False,
+):
+    """Yield pages from query.from_block onwards forever, tailing the chain head.
+
+    Only blocks at least `confirmations` deep are requested, so a page is
+    never built from a block that can still be reorged out.
+    """
+    next_block = query.from_block
+    while True:
+        safe = await client.get_height() - confirmations + 1
+        if next_block >= safe:
+            await asyncio.sleep(poll_interval)
+            continue
+        window = dataclasses.replace(query, from_block=next_block, to_block=safe)
+        async for res in iter_pages(client, window, safe, arrow=arrow):
+            yield res
+        next_block = safe
@@ -0,0 +1,170 @@
+"""
+Throughput and latency metrics for FlashLoan extraction runs.
+
+Every HyperSync request records its latency, blocks covered, logs and txs
+returned and approximate response bytes; every decoded / written page
+records its decode and write time and the events and blocks it carried.
+Events, blocks and their rates count decoded pages, so runs served from the
+response cache report them too; the fetched_* figures are network only. A
+run rolls these up into p50/p95/p99 and events/sec and exports them as a
+JSON report or a Prometheus text-format file (node_exporter textfile
+style), so runs can be compared.
+"""
+from __future__ import annotations
+import json
+import os
+import time
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Linearly interpolated q-quantile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def _rows(table_or_list) -> int:
+    if table_or_list is None:
+        return 0
+    return table_or_list.num_rows if hasattr(table_or_list, "num_rows") else len(table_or_list)
+
+
+def response_bytes(res) -> int:
+    """Payload size of a response: Arrow buffer sizes, or binary size of the hex fields."""
+    logs = res.data.logs
+    txs = res.data.transactions
+    if hasattr(logs, "nbytes"):
+        return logs.nbytes + (txs.nbytes if txs is not None else 0)
+    total = 0
+    for log in logs or []:
+        total += 40 + 32 * len(log.topics or [])
+        if log.data:
+            total += (len(log.data) - 2) // 2
+    return total + 48 * len(txs or [])
+
+
+class RunMetrics:
+    """Per-request and per-page samples of one extraction run."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.time()
+        self.finished = None
+        self.latency: list[float] = []
+        self.blocks: list[int] = []
+        self.logs: list[int] = []
+        self.txs: list[int] = []
+        self.bytes: list[int] = []
+        self.decode: list[float] = []
+        self.write: list[float] = []
+        self.page_events = 0
+        self.page_blocks = 0
+        self.retries = 0
+
+    def record_request(self, seconds: float, from_block: int, res):
+        self.latency.append(seconds)
+        self.blocks.append(max(0, res.next_block - from_block))
+        self.logs.append(_rows(res.data.logs))
+        self.txs.append(_rows(res.data.transactions))
+        self.bytes.append(response_bytes(res))
+
+    def record_retry(self):
+        self.retries += 1
+
+    def record_decode(self, seconds: float):
+        self.decode.append(seconds)
+
+    def record_write(self, seconds: float):
+        self.write.append(seconds)
+
+    def record_page(self, rows, blocks: int):
+        """A decoded page: its events (a table or list) and the blocks it covered."""
+        self.page_events += _rows(rows)
+        self.page_blocks += max(0, blocks)
+
+    def finish(self):
+        self.finished = time.time()
+
+    @property
+    def wall(self) -> float:
+        return (self.finished or time.time()) - self.started
+
+    def summary(self) -> dict:
+        wall = self.wall
+        report = {
+            "run": self.name,
+            "started": self.started,
+            "wall_seconds": wall,
+            "requests": len(self.latency),
+            "retries": self.retries,
+            "blocks": self.page_blocks,
+            "events": self.page_events,
+            "fetched_blocks": sum(self.blocks),
+            "fetched_logs": sum(self.logs),
+            "txs": sum(self.txs),
+            "response_bytes": sum(self.bytes),
+            "events_per_second": self.page_events / wall if wall > 0 else 0.0,
+            "blocks_per_second": self.page_blocks / wall if wall > 0 else 0.0,
+        }
+        for name, values in (("latency", self.latency), ("decode", self.decode), ("write", self.write)):
+            ordered = sorted(values)
+            report[f"{name}_seconds"] = {
+                "count": len(ordered),
+                "sum": sum(ordered),
+                **{f"p{int(q * 100)}": percentile(ordered, q) for q in QUANTILES},
+            }
+        return report
+
+    def report(self) -> str:
+        s = self.summary()
+        lat = s["latency_seconds"]
+        return (f"{s['requests']} requests, {s['events']:,} events in {s['wall_seconds']:.1f}s "
+                f"({s['events_per_second']:,.0f} events/s) | latency p50 {lat['p50']:.3f}s "
+                f"p95 {lat['p95']:.3f}s p99 {lat['p99']:.3f}s")
+
+    def write_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def write_prometheus(self, path: str):
+        """Write a Prometheus text-format file, replaced atomically for textfile collectors."""
+        s = self.summary()
+        label = f'run="{self.name}"'
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, value, labels: str = label):
+            lines.append(f"# HELP flashloan_{name} {help_text}")
+            lines.append(f"# TYPE flashloan_{name} {kind}")
+            lines.append(f"flashloan_{name}{{{labels}}} {value}")
+
+        metric("requests_total", "counter", "HyperSync requests completed.", s["requests"])
+        metric("request_retries_total", "counter", "HyperSync requests retried.", s["retries"])
+        metric("blocks_total", "counter", "Blocks covered by decoded pages.", s["blocks"])
+        metric("events_total", "counter", "FlashLoan events decoded.", s["events"])
+        metric("fetched_blocks_total", "counter", "Blocks covered by HyperSync responses.", s["fetched_blocks"])
+        metric("fetched_logs_total", "counter", "FlashLoan logs returned by HyperSync.", s["fetched_logs"])
+        metric("transactions_total", "counter", "Joined transactions returned.", s["txs"])
+        metric("response_bytes_total", "counter", "Approximate response payload bytes.", s["response_bytes"])
+        metric("events_per_second", "gauge", "Events per second of wall time.", s["events_per_second"])
+        metric("wall_seconds", "gauge", "Wall time of the run.", s["wall_seconds"])
+
+        for name, help_text in (("latency", "HyperSync request latency."),
+                                ("decode", "Page decode time."),
+                                ("write", "Page write time.")):
+            stats = s[f"{name}_seconds"]
+            lines.append(f"# HELP flashloan_{name}_seconds {help_text}")
+            lines.append(f"# TYPE flashloan_{name}_seconds summary")
+            for q in QUANTILES:
+                lines.append(f'flashloan_{name}_seconds{{{label},quantile="{q}"}} {stats[f"p{int(q * 100)}"]}')
+            lines.append(f"flashloan_{name}_seconds_sum{{{label}}} {stats['sum']}")
+            lines.append(f"flashloan_{name}_seconds_count{{{label}}} {stats['count']}")
+
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
@@ -0,0 +1,102 @@
+"""
+Page shape detection for HyperSync responses.
+
+The python client can return quantities as hex strings or ints, and logs
+whose topic count is not fixed by the selection. Instead of probing every
+row, a SchemaDecoder inspects the first non-empty page of a stream once and
+binds a decode function specialized for that shape. Later pages only have
+their first log / transaction compared against it. A page (or a row) that
+does not fit falls back to the generic, per-row probing decoder, or with
+strict=True raises SchemaMismatch.
+"""
+from __future__ import annotations
+from typing import Callable, NamedTuple
+
+from tx_store import TxJoinStore
+
+HEX = "hex"
+INT = "int"
+MISSING = "missing"
+
+
+class SchemaMismatch(ValueError):
+    """A page does not have the shape the stream started with."""
+
+
+def quantity_kind(value) -> str:
+    if value is None:
+        return MISSING
+    return HEX if isinstance(value, str) else INT
+
+
+class PageSchema(NamedTuple):
+    topics: int
+    gas_used: str | None
+    gas_price: str | None
+
+    def matches(self, other: PageSchema) -> bool:
+        """Same shape; a page without transactions matches either tx representation."""
+        if self.topics != other.topics:
+            return False
+        if self.gas_used is None or other.gas_used is None:
+            return True
+        return self.gas_used == other.gas_used and self.gas_price == other.gas_price
+
+
+def page_schema(res) -> PageSchema | None:
+    """Shape of a page from its first log and transaction, None for an empty page."""
+    logs = res.data.logs
+    if not logs:
+        return None
+    txs = res.data.transactions
+    tx = txs[0] if txs else None
+    return PageSchema(
+        len(logs[0].topics or []),
+        quantity_kind(tx.gas_used) if tx is not None else None,
+        quantity_kind(tx.gas_price) if tx is not None else None,
+    )
+
+
+def tx_loader(schema: PageSchema | None) -> Callable[[TxJoinStore, list], None]:
+    """TxJoinStore insert method specialized for the page's gas representation."""
+    if schema is not None and schema.gas_used == schema.gas_price == HEX:
+        return TxJoinStore.add_all_hex
+    if schema is not None and schema.gas_used == schema.gas_price == INT:
+        return TxJoinStore.add_all_int
+    return TxJoinStore.add_all
+
+
+class SchemaDecoder:
+    """Decode pages with a function bound once to the stream's page shape.
+
+    bind(schema) returns a page decode function; bind(None) must return the
+    generic one that probes each row.
+    """
+
+    def __init__(self, bind: Callable[[PageSchema | None], Callable], strict: bool = False):
+        self.bind = bind
+        self.strict = strict
+        self.generic = bind(None)
+        self.schema: PageSchema | None = None
+        self.decode: Callable | None = None
+        self.fallbacks = 0
+
+    def __call__(self, res):
+        schema = page_schema(res)
+        if schema is None:
+            return self.generic(res)
+        if self.schema is None:
+            self.schema = schema
+            self.decode = self.bind(schema)
+        elif not schema.matches(self.schema):
+            return self._mismatch(res, f"shape {tuple(schema)} differs from {tuple(self.schema)}")
+        try:
+            return self.decode(res)
+        except (AttributeError, IndexError, TypeError, ValueError) as err:
+            return self._mismatch(res, f"{type(err).__name__}: {err}")
+
+    def _mismatch(self, res, reason: str):
+        if self.strict:
+            raise SchemaMismatch(f"page ending at block {res.next_block:,}: {reason}")
+        self.fallbacks += 1
+        return self.generic(res)
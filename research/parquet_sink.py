@@ -0,0 +1,236 @@
+"""
+Partitioned Parquet dataset of decoded FlashLoan events.
+
+Events are written hive-style, one directory per token and block window:
+
+  <root>/token=USDC/block_window=20000000/part-20000000-20100000-0.parquet
+  <root>/_dataset.json        window size, read back by the reader
+
+File names carry the block range [from, to) the file's run covered within
+the window, so a run only replaces files whose range it covers entirely and
+a later run can extend a partly written window with files of its own.
+
+Columns keep the decoded types: uint64 block, exact uint256 amounts as
+32-byte big-endian fixed_size_binary next to the decimals-scaled float, and
+a categorical token. Files are zstd-compressed. Reads go through
+pyarrow.dataset, so a token / block range filter prunes whole directories
+before any file is opened, and row-group statistics skip the rest.
+
+Usage:
+  python parquet_sink.py flashloans_parquet --token USDC --from-block 20000000 --to-block 20100000
+
+Requires: pip install numpy pyarrow
+"""
+from __future__ import annotations
+import argparse
+import glob
+import json
+import os
+import re
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from events import CSV_FIELDS
+
+DEFAULT_WINDOW = 100_000
+META_FILE = "_dataset.json"  # leading underscore: ignored by dataset discovery
+
+FILE_RANGE = re.compile(r"part-(\d+)-(\d+)-\d+\.parquet")
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("token", pa.string()), ("block_window", pa.uint64())]), flavor="hive"
+)
+
+
+def dataset_window(root: str) -> int | None:
+    """Block window size a dataset was written with, None if root has no dataset."""
+    path = os.path.join(root, META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)["window"]
+
+
+class PartitionedParquetSink:
+    """Writes event tables into a token / block-window partitioned dataset.
+
+    Tables must arrive in block order and cover the run's blocks
+    [from_block, to_block). Rows are buffered until their window is complete
+    (a later window starts, or close()), then each of the window's token
+    partitions is written as a single file. Files of earlier runs whose
+    block range lies inside this run's are deleted; other files are kept,
+    and a run that would only partly cover an earlier file is refused
+    before anything is written. Without a range, each run is taken to cover
+    the whole windows it writes.
+    """
+
+    def __init__(self, root: str, window: int = DEFAULT_WINDOW, row_group_size: int = 128 * 1024,
+                 from_block: int | None = None, to_block: int | None = None):
+        existing = dataset_window(root)
+        if existing is not None and existing != window:
+            raise ValueError(f"{root} is partitioned by {existing}-block windows, not {window}")
+        self.root = root
+        self.window = window
+        self.from_block = from_block
+        self.to_block = to_block
+        if from_block is not None:
+            # up to the head, only the first window can be partly covered
+            last = to_block if to_block is not None else from_block + 1
+            for start in range(from_block - from_block % window, last, window):
+                self._covered_files(start)
+        os.makedirs(root, exist_ok=True)
+        with open(os.path.join(root, META_FILE), "w") as f:
+            json.dump({"window": window}, f)
+        self.row_group_size = row_group_size
+        self.options = ds.ParquetFileFormat().make_write_options(compression="zstd")
+        self.pending: list[pa.Table] = []
+        self.pending_window: int | None = None
+        self.written_windows: set[int] = set()
+        self.rows = 0
+        self.files = 0
+
+    def _run_range(self, start: int) -> tuple[int, int]:
+        """Blocks of window start that this run covers."""
+        lo = start if self.from_block is None else max(self.from_block, start)
+        hi = start + self.window if self.to_block is None else min(self.to_block, start + self.window)
+        return lo, hi
+
+    def _covered_files(self, start: int) -> list[str]:
+        """Existing files of window start inside this run's range; raises on partial overlaps."""
+        lo, hi = self._run_range(start)
+        covered = []
+        for path in glob.glob(os.path.join(self.root, "token=*", f"block_window={start}", "*.parquet")):
+            m = FILE_RANGE.fullmatch(os.path.basename(path))
+            a, b = (int(m.group(1)), int(m.group(2))) if m else (start, start + self.window)
+            if lo <= a and b <= hi:
+                covered.append(path)
+            elif a < hi and lo < b:
+                raise ValueError(f"{path} holds blocks {a}-{b}, which a run over {lo}-{hi} only partly "
+                                 f"covers; re-run all of {a}-{b} or continue the dataset from block {b}")
+        return covered
+
+    def write(self, table: pa.Table | None):
+        """Add a decoded table (columns as decode_flashloan_table)."""
+        if table is None or table.num_rows == 0:
+            return
+        blocks = table.column("block").to_numpy()
+        windows = blocks - blocks % self.window
+        starts = np.unique(windows)
+        for start in starts:
+            start = int(start)
+            if self.pending_window is not None and start < self.pending_window:
+                raise ValueError(f"block window {start} arrived after {self.pending_window}; "
+                                 "tables must be written in block order")
+            if start != self.pending_window:
+                self.flush()
+                self.pending_window = start
+            part = table if len(starts) == 1 else table.filter(windows == start)
+            self.pending.append(part)
+
+    def flush(self):
+        """Write the buffered window."""
+        if not self.pending:
+            return
+        table = pa.concat_tables(self.pending, promote_options="permissive")
+        table = table.set_column(
+            table.schema.get_field_index("token"), "token", pc.cast(table.column("token"), pa.string())
+        ).append_column("block_window", pa.array(np.full(table.num_rows, self.pending_window, dtype=np.uint64)))
+        for path in self._covered_files(self.pending_window):
+            os.remove(path)
+        lo, hi = self._run_range(self.pending_window)
+        written = []
+        ds.write_dataset(
+            table, self.root,
+            format="parquet",
+            partitioning=PARTITIONING,
+            basename_template=f"part-{lo}-{hi}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_options=self.options,
+            max_rows_per_group=self.row_group_size,
+            min_rows_per_group=min(self.row_group_size, table.num_rows),
+            file_visitor=written.append,
+        )
+        self.rows += table.num_rows
+        self.files += len(written)
+        self.written_windows.add(self.pending_window)
+        self.pending = []
+
+    def close(self):
+        """Write the last window and drop covered files of windows this run found empty."""
+        self.flush()
+        if self.from_block is None or self.to_block is None:
+            return
+        for start in range(self.from_block - self.from_block % self.window, self.to_block, self.window):
+            if start not in self.written_windows:
+                for path in self._covered_files(start):
+                    os.remove(path)
+
+
+def dataset_filter(tokens=None, from_block: int | None = None, to_block: int | None = None,
+                   window: int = DEFAULT_WINDOW) -> ds.Expression | None:
+    """Filter on token and block range [from_block, to_block), including the partition keys."""
+    terms = []
+    if tokens:
+        terms.append(ds.field("token").isin(list(tokens)))
+    if from_block is not None:
+        terms.append(ds.field("block_window") >= from_block - from_block % window)
+        terms.append(ds.field("block") >= from_block)
+    if to_block is not None:
+        terms.append(ds.field("block_window") < to_block)
+        terms.append(ds.field("block") < to_block)
+    if not terms:
+        return None
+    expr = terms[0]
+    for term in terms[1:]:
+        expr = expr & term
+    return expr
+
+
+def open_dataset(root: str) -> ds.Dataset:
+    return ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+
+
+def matching_files(root: str, tokens=None, from_block: int | None = None, to_block: int | None = None) -> list[str]:
+    """Files a filtered read would open."""
+    window = dataset_window(root) or DEFAULT_WINDOW
+    expr = dataset_filter(tokens, from_block, to_block, window)
+    return [f.path for f in open_dataset(root).get_fragments(filter=expr)]
+
+
+def read_events(root: str, tokens=None, from_block: int | None = None, to_block: int | None = None,
+                columns: list[str] | None = None) -> pa.Table:
+    """Events of the given tokens in [from_block, to_block), token as a categorical column."""
+    window = dataset_window(root) or DEFAULT_WINDOW
+    expr = dataset_filter(tokens, from_block, to_block, window)
+    table = open_dataset(root).to_table(columns=columns, filter=expr)
+    table = table.select([c for c in columns or CSV_FIELDS if c in table.column_names])
+    if "token" in table.column_names:
+        token = pc.dictionary_encode(table.column("token"))
+        table = table.set_column(table.schema.get_field_index("token"), "token",
+                                 token.cast(pa.dictionary(pa.uint16(), pa.string())))
+    return table.sort_by("block") if "block" in table.column_names else table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read a partitioned FlashLoan Parquet dataset")
+    parser.add_argument("root")
+    parser.add_argument("--token", action="append", default=None, help="token symbol (repeatable)")
+    parser.add_argument("--from-block", type=int, default=None)
+    parser.add_argument("--to-block", type=int, default=None, help="exclusive")
+    args = parser.parse_args()
+
+    files = matching_files(args.root, args.token, args.from_block, args.to_block)
+    total = len(open_dataset(args.root).files)
+    table = read_events(args.root, args.token, args.from_block, args.to_block)
+    print(f"Read {table.num_rows:,} events from {len(files)} of {total} files")
+    if table.num_rows:
+        amounts = table.group_by("token").aggregate([("amount", "count"), ("amount", "sum")])
+        for row in amounts.to_pylist():
+            print(f"  {row['token']:<10} {row['amount_count']:>10,} loans  {row['amount_sum']:>22,.2f}")
+
+
+if __name__ == "__main__":
+    main()
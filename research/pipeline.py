@@ -0,0 +1,153 @@
+"""
+Overlapped fetch -> decode -> sink pipeline for HyperSync pages.
+
+The fetch stage requests page k+1 as soon as page k is handed off, while
+decode runs in a worker thread and the sink writes on the event loop.
+Bounded queues between the stages give backpressure: a slow sink stalls
+decoding, which in turn stops prefetching once the queues are full. With an
+executor (e.g. a process pool) several pages are decoded at once; the sink
+still receives them in page order.
+"""
+from __future__ import annotations
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import AsyncIterator, Callable
+
+from metrics import RunMetrics
+
+_DONE = object()
+
+
+def _timed(decode: Callable, res):
+    """Run decode(res) and return (rows, seconds), for decoding in an executor."""
+    t0 = time.perf_counter()
+    rows = decode(res)
+    return rows, time.perf_counter() - t0
+
+
+class StageTimer:
+    """Busy time and item count of one pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.busy = 0.0
+        self.items = 0
+
+    def add(self, seconds: float):
+        self.busy += seconds
+        self.items += 1
+
+
+class PipelineStats:
+    """Per-stage busy time against wall time for one pipeline run."""
+
+    def __init__(self):
+        self.fetch = StageTimer("fetch")
+        self.decode = StageTimer("decode")
+        self.sink = StageTimer("sink")
+        self.wall = 0.0
+
+    @property
+    def stages(self) -> list[StageTimer]:
+        return [self.fetch, self.decode, self.sink]
+
+    @property
+    def overlapped(self) -> float:
+        """Seconds of stage work hidden behind other stages."""
+        return max(0.0, sum(s.busy for s in self.stages) - self.wall)
+
+    def report(self) -> str:
+        busy = sum(s.busy for s in self.stages)
+        parts = [f"{s.name} {s.busy:.2f}s/{s.items}" for s in self.stages]
+        pct = self.overlapped / busy * 100 if busy else 0
+        return (f"{' | '.join(parts)} | wall {self.wall:.2f}s | "
+                f"overlapped {self.overlapped:.2f}s ({pct:.0f}% of stage time)")
+
+
+async def run_pipeline(
+    pages: AsyncIterator,
+    decode: Callable,
+    sink: Callable,
+    prefetch: int = 2,
+    metrics: RunMetrics | None = None,
+    executor: Executor | None = None,
+    from_block: int | None = None,
+) -> PipelineStats:
+    """Run fetch, decode and sink concurrently.
+
+    pages yields responses, decode(res) -> rows runs in a thread, and
+    sink(res, rows) is called in page order. prefetch bounds how many
+    pages may wait in each queue. Per-page decode and write times are
+    also recorded into metrics when given, and with from_block (where the
+    pages start) each page's events and blocks.
+
+    With an executor, decode and the pages must be picklable (for a process
+    pool); up to about prefetch + 2 pages are decoded concurrently.
+    """
+    if prefetch < 1:
+        raise ValueError("prefetch must be at least 1")
+
+    stats = PipelineStats()
+    fetched = asyncio.Queue(maxsize=prefetch)
+    decoded = asyncio.Queue(maxsize=prefetch)
+
+    async def fetch_stage():
+        it = pages.__aiter__()
+        while True:
+            t0 = time.perf_counter()
+            try:
+                res = await it.__anext__()
+            except StopAsyncIteration:
+                break
+            stats.fetch.add(time.perf_counter() - t0)
+            await fetched.put(res)
+        await fetched.put(_DONE)
+
+    async def decode_stage():
+        if executor is not None:
+            loop = asyncio.get_running_loop()
+            while (res := await fetched.get()) is not _DONE:
+                await decoded.put((res, loop.run_in_executor(executor, _timed, decode, res)))
+            await decoded.put(_DONE)
+            return
+        while (res := await fetched.get()) is not _DONE:
+            t0 = time.perf_counter()
+            rows = await asyncio.to_thread(decode, res)
+            stats.decode.add(time.perf_counter() - t0)
+            if metrics is not None:
+                metrics.record_decode(time.perf_counter() - t0)
+            await decoded.put((res, rows))
+        await decoded.put(_DONE)
+
+    async def sink_stage():
+        position = from_block
+        while (item := await decoded.get()) is not _DONE:
+            if executor is not None:
+                res, future = item
+                rows, seconds = await future
+                stats.decode.add(seconds)
+                if metrics is not None:
+                    metrics.record_decode(seconds)
+                item = res, rows
+            t0 = time.perf_counter()
+            sink(*item)
+            stats.sink.add(time.perf_counter() - t0)
+            if metrics is not None:
+                metrics.record_write(time.perf_counter() - t0)
+                if position is not None:
+                    metrics.record_page(item[1], item[0].next_block - position)
+            position = item[0].next_block
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(stage()) for stage in (fetch_stage, decode_stage, sink_stage)]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    stats.wall = time.perf_counter() - start
+    return stats
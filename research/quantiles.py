@@ -0,0 +1,221 @@
+"""
+Mergeable streaming quantile sketches of loan amounts and gas used.
+
+A KLLSketch (Karnin, Lang, Liberty 2016) keeps a few hundred values in
+levels of compactors: level h holds values standing for 2**h inputs each.
+When a level outgrows its capacity it is sorted and every other value (odd
+or even positions, at random) moves up a level with twice the weight. With
+the default k=200 a quantile's rank is within about 1.3% of n, using
+O(k) floats however many values are added. Values are added a whole NumPy
+array at a time and two sketches merge by concatenating levels, so
+sketches from shards or from a resumed run combine into one.
+
+GroupedQuantiles keeps one amount sketch and one gas sketch (gas > 0 only)
+per group, with the group keys of aggregate.py ("token", "size", ...):
+
+  q = GroupedQuantiles(["token"])
+  q.add_table(table)
+  q.groups["USDC"].amount.quantiles([0.5, 0.9, 0.99])
+
+Requires: pip install numpy pyarrow
+"""
+from __future__ import annotations
+import base64
+import math
+
+import numpy as np
+import pyarrow as pa
+
+from aggregate import group_codes, group_key, key_spec
+
+DEFAULT_K = 200
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+def k_for_error(eps: float) -> int:
+    """Smallest k whose normalized rank error is at most eps (about 1.65 / k)."""
+    return max(8, math.ceil(1.65 / eps))
+
+
+def _encode(values: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(values, dtype="<f8").tobytes()).decode()
+
+
+def _decode(text: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(text), dtype="<f8").copy()
+
+
+class KLLSketch:
+    """Approximate quantiles of a float stream in bounded memory."""
+
+    def __init__(self, k: int = DEFAULT_K, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self.min = math.nan
+        self.max = math.nan
+        self.levels: list[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def _compress(self):
+        """Compact the lowest full level until the sketch fits its total capacity."""
+        while len(self) > sum(self._capacity(h) for h in range(len(self.levels))):
+            level = next(h for h in range(len(self.levels)) if len(self.levels[h]) >= self._capacity(h))
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            keep = items[len(items) - len(items) % 2:]  # an odd one out stays
+            promoted = items[int(self._rng.integers(2)):len(items) - len(keep):2]
+            self.levels[level] = keep
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def update(self, values):
+        """Add an array (or scalar) of values."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not len(values):
+            return
+        lo, hi = float(values.min()), float(values.max())
+        self.min = lo if self.n == 0 else min(self.min, lo)
+        self.max = hi if self.n == 0 else max(self.max, hi)
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: KLLSketch):
+        """Fold in another sketch, e.g. from another shard."""
+        if not other.n:
+            return
+        self.min = other.min if self.n == 0 else min(self.min, other.min)
+        self.max = other.max if self.n == 0 else max(self.max, other.max)
+        self.n += other.n
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self._compress()
+
+    def __len__(self) -> int:
+        """Values retained (not added)."""
+        return sum(len(items) for items in self.levels)
+
+    def quantiles(self, qs) -> list[float]:
+        """Approximate values at each fraction in qs (0 = min, 1 = max)."""
+        if not self.n:
+            return [math.nan] * len(qs)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(v), 1 << h, dtype=np.int64) for h, v in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items = items[order]
+        cumulative = np.cumsum(weights[order])
+        out = []
+        for q in qs:
+            if q <= 0:
+                out.append(self.min)
+            elif q >= 1:
+                out.append(self.max)
+            else:
+                i = int(np.searchsorted(cumulative, q * self.n, side="left"))
+                out.append(float(items[min(i, len(items) - 1)]))
+        return out
+
+    def quantile(self, q: float) -> float:
+        return self.quantiles([q])[0]
+
+    def rank(self, value: float) -> float:
+        """Approximate fraction of values <= value."""
+        if not self.n:
+            return math.nan
+        weight = sum(int(np.count_nonzero(items <= value)) << h for h, items in enumerate(self.levels))
+        return weight / self.n
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "n": self.n, "min": self.min, "max": self.max,
+                "levels": [_encode(items) for items in self.levels]}
+
+    @classmethod
+    def from_dict(cls, d: dict, seed: int = 0) -> KLLSketch:
+        sketch = cls(d["k"], seed)
+        sketch.n, sketch.min, sketch.max = d["n"], d["min"], d["max"]
+        sketch.levels = [_decode(text) for text in d["levels"]]
+        return sketch
+
+
+class GroupQuantiles:
+    """Loan amount and gas sketches of one group."""
+
+    __slots__ = ("amount", "gas")
+
+    def __init__(self, k: int = DEFAULT_K):
+        self.amount = KLLSketch(k)
+        self.gas = KLLSketch(k)
+
+    def merge(self, other: GroupQuantiles):
+        self.amount.merge(other.amount)
+        self.gas.merge(other.gas)
+
+
+class GroupedQuantiles:
+    """Per-group amount and gas sketches, updated a table at a time."""
+
+    def __init__(self, keys=("token",), k: int = DEFAULT_K):
+        self.keys = [group_key(key) for key in keys]
+        self.key_specs = [key_spec(key) for key in keys]
+        self.k = k
+        self.groups: dict = {}
+
+    def _group(self, label) -> GroupQuantiles:
+        group = self.groups.get(label)
+        if group is None:
+            group = self.groups[label] = GroupQuantiles(self.k)
+        return group
+
+    def add_table(self, table: pa.Table | None):
+        """Add one decoded event table (columns as decode_flashloan_table)."""
+        if table is None or table.num_rows == 0:
+            return
+        codes, labels = group_codes(self.keys, table)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+        amount = table.column("amount").to_numpy()[order]
+        gas = table.column("gas_used").to_numpy()[order]
+        for g, label in enumerate(labels):
+            group = self._group(label)
+            group.amount.update(amount[bounds[g]:bounds[g + 1]])
+            group_gas = gas[bounds[g]:bounds[g + 1]]
+            group.gas.update(group_gas[group_gas > 0])
+
+    def merge(self, other: GroupedQuantiles):
+        """Add another instance's sketches (same keys)."""
+        for label, group in other.groups.items():
+            self._group(label).merge(group)
+
+    def combined(self, labels) -> GroupQuantiles:
+        """One group's worth of sketches merged from several groups."""
+        out = GroupQuantiles(self.k)
+        for label in labels:
+            if label in self.groups:
+                out.merge(self.groups[label])
+        return out
+
+    def to_dict(self) -> dict:
+        if None in self.key_specs:
+            raise ValueError("only sketches over named group keys can be serialized")
+        return {
+            "keys": self.key_specs,
+            "k": self.k,
+            "groups": [[list(label) if isinstance(label, tuple) else label,
+                        group.amount.to_dict(), group.gas.to_dict()]
+                       for label, group in self.groups.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> GroupedQuantiles:
+        quantiles = cls(d["keys"], d["k"])
+        for label, amount, gas in d["groups"]:
+            group = quantiles._group(tuple(label) if isinstance(label, list) else label)
+            group.amount = KLLSketch.from_dict(amount)
+            group.gas = KLLSketch.from_dict(gas)
+        return quantiles
@@ -3,32 +3,37 @@
 Query ALL Balancer V2 FlashLoan events using Envio HyperSync.
 Exports to CSV for analysis.
 
-Requires: pip install hypersync
+Requires: pip install hypersync numpy pyarrow
 """
 from __future__ import annotations
 import hypersync
+import argparse
 import asyncio
 import os
 import csv
 from typing import Optional
 from datetime import datetime
 
+from hypersync_stream import iter_pages, stream_decoded
+from page_schema import PageSchema, SchemaDecoder, tx_loader
+from response_cache import ResponseCache
+from scheduler import schedule
+from tokens import REGISTRY
+from tx_store import TxJoinStore
+
 BALANCER_VAULT = "0xBA12222222228d8Ba445958a75a0704d566BF2C8"
 FLASHLOAN_TOPIC = "0x0d7d75e01ab95780d3cd1c8ec0dd6c2ce19e3a20427eec8bf53283b6fb8e95f0"
 
-STABLECOINS = {
-    "0x000000000000000000000000a0b86991c6218b36c1d19d4a2e9eb0ce3606eb48": "USDC",
-    "0x000000000000000000000000dac17f958d2ee523a2206206994597c13d831ec7": "USDT",
-    "0x0000000000000000000000006b175474e89094c44da98b954eedeac495271d0f": "DAI",
-    "0x000000000000000000000000853d955acef822db058eb8505911ed77f175b99e": "FRAX",
-    "0x0000000000000000000000005f98805a4e8be255a32880fdec7f6728c6568ba0": "LUSD",
-    "0x000000000000000000000000c02aaa39b223fe8d0a0e5c4f27ead9083c756cc2": "WETH",
-    "0x0000000000000000000000002260fac5e5542a773aa44fbcfedf7c193bc2c599": "WBTC",
-}
+CACHE_DIR = "hypersync_cache"
+
+STABLECOINS = ["USDC", "USDT", "DAI", "FRAX", "LUSD"]
 
 
-async def query_flashloans(from_block: int, to_block: int | None = None):
-    """Query ALL FlashLoan events from Balancer Vault."""
+async def stream_flashloans(from_block: int, to_block: int | None = None, cache_dir: str | None = CACHE_DIR):
+    """Yield decoded FlashLoan events from Balancer Vault, one page at a time.
+    
+    Responses are served from the local cache under cache_dir, unless it is None.
+    """
     
     api_token = os.environ.get("ENVIO_API_KEY") or os.environ.get("ENVIO_API_TOKEN")
     if not api_token:
@@ -40,7 +45,7 @@ async def query_flashloans(from_block: int, to_block: int | None = None):
             bearer_token=api_token
         )
     
-    client = hypersync.HypersyncClient(config)
+    client = schedule(hypersync.HypersyncClient(config), authenticated=bool(api_token))
     
     query = hypersync.Query(
         from_block=from_block,
@@ -76,34 +81,34 @@ async def query_flashloans(from_block: int, to_block: int | None = None):
     if to_block:
         print(f"  to block {to_block}")
     
-    all_logs = []
-    all_txs = {}
+    fetched = 0
+    if cache_dir is None:
+        pages = iter_pages(client, query, to_block)
+    else:
+        pages = ResponseCache(cache_dir, query).pages(client, query, to_block)
+    async for res, rows in stream_decoded(pages, SchemaDecoder(bind_decoder)):
+        fetched += len(rows)
+        print(f"  Fetched {fetched} events so far (at block {res.next_block})...")
+        yield rows
+
+
+def bind_decoder(schema: PageSchema | None):
+    """Page decoder for one page shape; None gives the generic, per-row probing one."""
+    load_txs = tx_loader(schema)
+    full_topics = schema is not None and schema.topics >= 3
     
-    while True:
-        res = await client.get(query)
-        
-        if res.data.logs:
-            all_logs.extend(res.data.logs)
-        
-        if res.data.transactions:
-            for tx in res.data.transactions:
-                if hasattr(tx, 'hash') and tx.hash:
-                    all_txs[tx.hash] = tx
-        
-        print(f"  Fetched {len(all_logs)} events so far (at block {res.next_block})...")
-        
-        if res.next_block >= (to_block or res.archive_height):
-            break
-        
-        query.from_block = res.next_block
+    def decode(res):
+        txs = TxJoinStore()
+        load_txs(txs, res.data.transactions)
+        return [decode_flashloan_log(log, txs, full_topics) for log in res.data.logs or []]
     
-    return all_logs, all_txs
+    return decode
 
 
-def decode_flashloan_log(log, txs):
+def decode_flashloan_log(log, txs, full_topics: bool = False):
     """Decode a FlashLoan event log."""
-    token_topic = log.topics[2] if len(log.topics) > 2 else None
-    token_name = STABLECOINS.get(token_topic, token_topic[:20] + "..." if token_topic else "Unknown")
+    token_topic = log.topics[2] if full_topics or len(log.topics) > 2 else None
+    token_id = REGISTRY.lookup(token_topic)
     
     amount = 0
     fee = 0
@@ -112,19 +117,13 @@ def decode_flashloan_log(log, txs):
         if len(log.data) >= 130:
             fee = int(log.data[66:130], 16)
     
-    tx = txs.get(log.transaction_hash)
-    gas_used = 0
-    gas_price = 0
-    if tx:
-        if hasattr(tx, 'gas_used') and tx.gas_used:
-            gas_used = int(tx.gas_used, 16) if isinstance(tx.gas_used, str) else tx.gas_used
-        if hasattr(tx, 'gas_price') and tx.gas_price:
-            gas_price = int(tx.gas_price, 16) if isinstance(tx.gas_price, str) else tx.gas_price
+    gas_used, gas_price = txs.get(log.transaction_hash) or (0, 0)
     
     return {
         "tx_hash": log.transaction_hash,
         "block": log.block_number,
-        "token": token_name,
+        "token": REGISTRY.symbols[token_id],
+        "token_id": token_id,
         "token_topic": token_topic,
         "amount": amount,
         "fee": fee,
@@ -133,56 +132,71 @@ def decode_flashloan_log(log, txs):
     }
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Query all Balancer V2 FlashLoan events and export the stablecoin ones")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="local Parquet cache of HyperSync responses")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always fetch from HyperSync, bypassing the local cache")
+    args = parser.parse_args()
+    if args.no_cache:
+        args.cache_dir = None
+    return args
+
+
 async def main():
+    args = parse_args()
     from_block = 20000000
     to_block = 20050000
     
-    logs, txs = await query_flashloans(from_block, to_block)
+    total = 0
+    unique_txs = set()
+    stablecoin_count = 0
+    samples = []
+    
+    with open("balancer_stablecoin_flashloans.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["tx_hash", "block", "token", "amount", "fee", "gas_used", "gas_price_gwei"])
+        writer.writeheader()
+        
+        async for rows in stream_flashloans(from_block, to_block, args.cache_dir):
+            total += len(rows)
+            for decoded in rows:
+                if decoded["token"] not in STABLECOINS:
+                    continue
+                stablecoin_count += 1
+                unique_txs.add(decoded["tx_hash"])
+                if len(samples) < 20:
+                    samples.append(decoded)
+                writer.writerow({
+                    "tx_hash": decoded["tx_hash"],
+                    "block": decoded["block"],
+                    "token": decoded["token"],
+                    "amount": decoded["amount"],
+                    "fee": decoded["fee"],
+                    "gas_used": decoded["gas_used"],
+                    "gas_price_gwei": decoded["gas_price_gwei"],
+                })
     
     print(f"\n{'='*80}")
-    print(f"Found {len(logs)} FlashLoan events")
+    print(f"Found {total} FlashLoan events")
     print(f"{'='*80}\n")
     
-    if not logs:
+    if not total:
         print("No flash loans found.")
         return
     
-    unique_txs = set()
-    stablecoin_events = []
-    
-    for log in logs:
-        decoded = decode_flashloan_log(log, txs)
-        if decoded["token"] in ["USDC", "USDT", "DAI", "FRAX", "LUSD"]:
-            stablecoin_events.append(decoded)
-            unique_txs.add(decoded["tx_hash"])
-    
-    print(f"Stablecoin flash loans: {len(stablecoin_events)} events in {len(unique_txs)} unique TXs")
+    print(f"Stablecoin flash loans: {stablecoin_count} events in {len(unique_txs)} unique TXs")
     print()
     
-    with open("balancer_stablecoin_flashloans.csv", "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=["tx_hash", "block", "token", "amount", "fee", "gas_used", "gas_price_gwei"])
-        writer.writeheader()
-        for event in stablecoin_events:
-            writer.writerow({
-                "tx_hash": event["tx_hash"],
-                "block": event["block"],
-                "token": event["token"],
-                "amount": event["amount"],
-                "fee": event["fee"],
-                "gas_used": event["gas_used"],
-                "gas_price_gwei": event["gas_price_gwei"],
-            })
-    
     print(f"Saved to balancer_stablecoin_flashloans.csv")
     print()
     
     print("Sample stablecoin flash loan TXs:")
     print("-" * 80)
     seen = set()
-    for event in stablecoin_events[:20]:
+    for event in samples:
         if event["tx_hash"] not in seen:
             seen.add(event["tx_hash"])
-            decimals = 6 if event["token"] in ["USDC", "USDT"] else 18
+            decimals = int(REGISTRY.decimals[event["token_id"]])
             amount_fmt = event["amount"] / (10 ** decimals)
             print(f"TX: {event['tx_hash']}")
             print(f"   Block: {event['block']}, Token: {event['token']}")
@@ -2,40 +2,35 @@
 """
 Query Balancer V2 FlashLoan events for stablecoins using Envio HyperSync.
 
-Requires: pip install hypersync
+Requires: pip install hypersync numpy pyarrow
 """
 from __future__ import annotations
 import hypersync
+import argparse
 import asyncio
 import os
 from typing import Optional
 from datetime import datetime
 
+from hypersync_stream import iter_pages, stream_decoded
+from page_schema import PageSchema, SchemaDecoder, tx_loader
+from response_cache import ResponseCache
+from scheduler import schedule
+from tokens import EUR_STABLECOIN, REGISTRY, STABLECOIN
+from tx_store import TxJoinStore
+
 BALANCER_VAULT = "0xBA12222222228d8Ba445958a75a0704d566BF2C8"
 
 FLASHLOAN_TOPIC = "0x0d7d75e01ab95780d3cd1c8ec0dd6c2ce19e3a20427eec8bf53283b6fb8e95f0"
 
-STABLECOINS = {
-    "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48": "USDC",
-    "0xdac17f958d2ee523a2206206994597c13d831ec7": "USDT",
-    "0x6b175474e89094c44da98b954eedeac495271d0f": "DAI",
-    "0x4fabb145d64652a948d72533023f6e7a623c7c53": "BUSD",
-    "0x8e870d67f660d95d5be530380d0ec0bd388289e1": "USDP",
-    "0x0000000000085d4780b73119b644ae5ecd22b376": "TUSD",
-    "0x853d955acef822db058eb8505911ed77f175b99e": "FRAX",
-    "0x5f98805a4e8be255a32880fdec7f6728c6568ba0": "LUSD",
-    "0x57ab1ec28d129707052df4df418d58a2d46d5f51": "sUSD",
-    "0x1abaea1f7c830bd89acc67ec4af516284b1bc33c": "EURC",
-}
-
-STABLECOIN_TOPICS = {
-    "0x000000000000000000000000" + addr[2:]: name 
-    for addr, name in STABLECOINS.items()
-}
+CACHE_DIR = "hypersync_cache"
 
 
-async def query_flashloans(from_block: int, to_block: int | None = None):
-    """Query FlashLoan events from Balancer Vault."""
+async def stream_flashloans(from_block: int, to_block: int | None = None, cache_dir: str | None = CACHE_DIR):
+    """Yield decoded FlashLoan events from Balancer Vault, one page at a time.
+    
+    Responses are served from the local cache under cache_dir, unless it is None.
+    """
     
     api_token = os.environ.get("ENVIO_API_KEY") or os.environ.get("ENVIO_API_TOKEN")
     if not api_token:
@@ -47,7 +42,7 @@ async def query_flashloans(from_block: int, to_block: int | None = None):
             bearer_token=api_token
         )
     
-    client = hypersync.HypersyncClient(config)
+    client = schedule(hypersync.HypersyncClient(config), authenticated=bool(api_token))
     
     query = hypersync.Query(
         from_block=from_block,
@@ -58,7 +53,7 @@ async def query_flashloans(from_block: int, to_block: int | None = None):
                 topics=[
                     [FLASHLOAN_TOPIC],
                     [],
-                    list(STABLECOIN_TOPICS.keys()),
+                    [REGISTRY.topic(i) for i in REGISTRY.of_class(STABLECOIN) + REGISTRY.of_class(EUR_STABLECOIN)],
                 ],
             )
         ],
@@ -85,35 +80,36 @@ async def query_flashloans(from_block: int, to_block: int | None = None):
     if to_block:
         print(f"  to block {to_block}")
     
-    all_logs = []
-    all_txs = {}
-    
-    while True:
-        res = await client.get(query)
-        
-        if res.data.logs:
-            all_logs.extend(res.data.logs)
-        
-        if res.data.transactions:
-            for tx in res.data.transactions:
-                all_txs[tx.hash] = tx
-        
-        print(f"  Fetched {len(all_logs)} events so far (at block {res.next_block})...")
-        
-        if res.next_block >= (to_block or res.archive_height):
-            break
-        
-        query.from_block = res.next_block
-    
-    return all_logs, all_txs
-
-
-def decode_flashloan_log(log, txs):
+    fetched = 0
+    if cache_dir is None:
+        pages = iter_pages(client, query, to_block)
+    else:
+        pages = ResponseCache(cache_dir, query).pages(client, query, to_block)
+    async for res, rows in stream_decoded(pages, SchemaDecoder(bind_decoder)):
+        fetched += len(rows)
+        print(f"  Fetched {fetched} events so far (at block {res.next_block})...")
+        yield rows
+
+
+def bind_decoder(schema: PageSchema | None):
+    """Page decoder for one page shape; None gives the generic, per-row probing one."""
+    load_txs = tx_loader(schema)
+    full_topics = schema is not None and schema.topics >= 3
+    
+    def decode(res):
+        txs = TxJoinStore()
+        load_txs(txs, res.data.transactions)
+        return [decode_flashloan_log(log, txs, full_topics) for log in res.data.logs or []]
+    
+    return decode
+
+
+def decode_flashloan_log(log, txs, full_topics: bool = False):
     """Decode a FlashLoan event log."""
-    recipient_topic = log.topics[1] if len(log.topics) > 1 else None
-    token_topic = log.topics[2] if len(log.topics) > 2 else None
+    recipient_topic = log.topics[1] if full_topics or len(log.topics) > 1 else None
+    token_topic = log.topics[2] if full_topics or len(log.topics) > 2 else None
     
-    token_name = STABLECOIN_TOPICS.get(token_topic, "Unknown")
+    token_id = REGISTRY.lookup(token_topic)
     
     amount = 0
     fee = 0
@@ -122,14 +118,12 @@ def decode_flashloan_log(log, txs):
         if len(log.data) >= 130:
             fee = int(log.data[66:130], 16)
     
-    tx = txs.get(log.transaction_hash)
-    gas_used = int(tx.gas_used, 16) if tx and tx.gas_used else 0
-    gas_price = int(tx.gas_price, 16) if tx and tx.gas_price else 0
+    gas_used, gas_price = txs.get(log.transaction_hash) or (0, 0)
     
     return {
         "tx_hash": log.transaction_hash,
         "block": log.block_number,
-        "token": token_name,
+        "token": REGISTRY.symbols[token_id],
         "token_address": token_topic,
         "amount": amount,
         "fee": fee,
@@ -139,43 +133,60 @@ def decode_flashloan_log(log, txs):
     }
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Query Balancer V2 stablecoin FlashLoan events")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="local Parquet cache of HyperSync responses")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always fetch from HyperSync, bypassing the local cache")
+    args = parser.parse_args()
+    if args.no_cache:
+        args.cache_dir = None
+    return args
+
+
 async def main():
+    args = parse_args()
     from_block = 20000000
     to_block = 20100000
     
-    logs, txs = await query_flashloans(from_block, to_block)
+    total = 0
+    by_token = {}
+    samples = []
+    
+    async for rows in stream_flashloans(from_block, to_block, args.cache_dir):
+        total += len(rows)
+        for decoded in rows:
+            token = decoded["token"]
+            if token not in by_token:
+                by_token[token] = {"count": 0, "amount": 0, "gas_used": 0}
+            by_token[token]["count"] += 1
+            by_token[token]["amount"] += decoded["amount"]
+            by_token[token]["gas_used"] += decoded["gas_used"]
+            if len(samples) < 10:
+                samples.append(decoded)
     
     print(f"\n{'='*80}")
-    print(f"Found {len(logs)} stablecoin FlashLoan events")
+    print(f"Found {total} stablecoin FlashLoan events")
     print(f"{'='*80}\n")
     
-    if not logs:
+    if not total:
         print("No stablecoin flash loans found in this range.")
         print("Try querying all FlashLoan events (remove stablecoin filter).")
         return
     
-    by_token = {}
-    for log in logs:
-        decoded = decode_flashloan_log(log, txs)
-        token = decoded["token"]
-        if token not in by_token:
-            by_token[token] = []
-        by_token[token].append(decoded)
-    
     print("Summary by stablecoin:")
     print("-" * 60)
-    for token, events in sorted(by_token.items(), key=lambda x: -len(x[1])):
-        total_amount = sum(e["amount"] for e in events)
-        avg_gas = sum(e["gas_used"] for e in events) / len(events) if events else 0
-        print(f"  {token}: {len(events)} flash loans")
+    for token, totals in sorted(by_token.items(), key=lambda x: -x[1]["count"]):
+        total_amount = totals["amount"]
+        avg_gas = totals["gas_used"] / totals["count"]
+        print(f"  {token}: {totals['count']} flash loans")
         print(f"    Total volume: {total_amount / 1e6:,.0f} (6 decimals)")
         print(f"    Avg gas used: {avg_gas:,.0f}")
         print()
     
     print("\nSample transactions:")
     print("-" * 60)
-    for i, log in enumerate(logs[:10]):
-        decoded = decode_flashloan_log(log, txs)
+    for i, decoded in enumerate(samples):
         print(f"{i+1}. TX: {decoded['tx_hash'][:20]}...")
         print(f"   Block: {decoded['block']}")
         print(f"   Token: {decoded['token']}")
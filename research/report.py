@@ -0,0 +1,230 @@
+"""
+Statistics tables of BALANCER_COMPARISON.md, computed from decoded events.
+
+Reads the token, amount and gas_used columns of an event dataset (a
+snapshot directory, a partitioned Parquet dataset, a Parquet file or a CSV
+export) and computes every table in one vectorized pass: loan-size buckets
+by np.searchsorted over the amounts, then one sort by (group, amount) gives
+counts, totals, averages, medians and gas minimums for all groups at once.
+Only loans with a known gas_used (joined receipt) count, as in the
+hand-made tables. On a snapshot the columns are memory-mapped, so a report
+over all 1.7M events takes a few seconds.
+
+Usage:
+  python report.py flashloans_snapshot                      # Markdown to stdout
+  python report.py balancer_flashloans_full.csv -o stats.md
+  python report.py flashloans_parquet --update BALANCER_COMPARISON.md
+
+--update replaces the first table under each matching "## " heading of an
+existing document and leaves the rest of it untouched.
+
+Requires: pip install numpy pyarrow
+"""
+from __future__ import annotations
+import argparse
+import os
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from aggregate import SIZE_EDGES, SIZE_LABELS, class_key, token_key
+from parquet_sink import META_FILE, read_events
+from snapshot import MANIFEST, Snapshot
+from tokens import STABLECOIN
+
+COLUMNS = ["token", "amount", "gas_used"]
+ETH_TOKEN = "WETH"
+
+SECTIONS = {
+    "stablecoins": "## Stablecoin Flash Loan Statistics",
+    "weth": "## WETH Flash Loan Statistics",
+    "sizes": "## Loan Size Distribution (Stablecoins)",
+    "gas": "## Gas Usage by Loan Size",
+}
+
+
+def load_events(path: str, columns: list[str] = COLUMNS) -> pa.Table:
+    """Columns of an event snapshot, Parquet dataset / file or CSV, token as a categorical."""
+    if os.path.isdir(path):
+        if os.path.exists(os.path.join(path, MANIFEST)):
+            return Snapshot(path).table(columns)
+        if os.path.exists(os.path.join(path, META_FILE)):
+            return read_events(path, columns=columns)
+        raise ValueError(f"{path} is neither a snapshot nor a partitioned Parquet dataset")
+    if path.endswith(".parquet"):
+        table = pq.read_table(path, columns=columns)
+    else:
+        table = pacsv.read_csv(path, convert_options=pacsv.ConvertOptions(
+            include_columns=columns,
+            column_types={"token": pa.dictionary(pa.int32(), pa.string()), "amount": pa.float64(),
+                          "gas_used": pa.uint64()}))
+    token = table.column("token")
+    if not pa.types.is_dictionary(token.type):
+        token = pc.dictionary_encode(token)
+    token = token.cast(pa.dictionary(pa.uint16(), pa.string())).combine_chunks()
+    return table.set_column(table.schema.get_field_index("token"), "token", token)
+
+
+def group_stats(codes: np.ndarray, groups: int, amount: np.ndarray, gas: np.ndarray) -> dict[str, np.ndarray]:
+    """Per-group count, total / average / median amount and average / minimum gas."""
+    order = np.lexsort((amount, codes))
+    amount, gas = amount[order], gas[order]
+    counts = np.bincount(codes, minlength=groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    present = counts > 0
+    safe = np.maximum(counts, 1)
+    median = np.full(groups, np.nan)
+    min_gas = np.zeros(groups, dtype=np.uint64)
+    if present.any():
+        first, n = starts[present], counts[present]
+        median[present] = (amount[first + (n - 1) // 2] + amount[first + n // 2]) / 2
+        min_gas[present] = np.minimum.reduceat(gas, first)
+    total = np.bincount(codes[order], weights=amount, minlength=groups)
+    gas_total = np.bincount(codes[order], weights=gas.astype(np.float64), minlength=groups)
+    return {
+        "count": counts,
+        "total": total,
+        "avg": total / safe,
+        "median": median,
+        "avg_gas": gas_total / safe,
+        "min_gas": min_gas,
+    }
+
+
+def compute_report(table: pa.Table) -> dict:
+    """All report figures for a decoded event table (token, amount and gas_used columns)."""
+    gas = table.column("gas_used").to_numpy()
+    known = gas > 0
+    token_codes, symbols = token_key(table)
+    class_codes, _ = class_key(table)
+    amount = table.column("amount").to_numpy()[known]
+    gas = gas[known]
+    token_codes = np.asarray(token_codes, dtype=np.int64)[known]
+    stable = class_codes[known] == STABLECOIN
+
+    by_token = group_stats(token_codes, len(symbols), amount, gas)
+    buckets = np.searchsorted(SIZE_EDGES, amount[stable], side="right")
+    by_size = group_stats(buckets, len(SIZE_LABELS), amount[stable], gas[stable])
+    stable_tokens = sorted({int(c) for c in np.unique(token_codes[stable])}, key=lambda c: -by_token["count"][c])
+    return {
+        "symbols": symbols,
+        "by_token": by_token,
+        "by_size": by_size,
+        "stable_tokens": stable_tokens,
+        "eth_token": symbols.index(ETH_TOKEN) if ETH_TOKEN in symbols else None,
+        "stable_loans": int(stable.sum()),
+    }
+
+
+def format_amount(value: float) -> str:
+    """2.19 / 42,957 below 100K, three significant digits with a suffix above (263K, 1.19B)."""
+    if np.isnan(value):
+        return "-"
+    if value < 100:
+        return f"{value:.3g}"
+    if value < 1e5:
+        return f"{value:,.0f}"
+    for scale, suffix in ((1e3, "K"), (1e6, "M"), (1e9, "B"), (1e12, "T")):
+        scaled = float(f"{value / scale:.3g}")
+        if scaled < 1000 or suffix == "T":
+            return f"{scaled:,.{max(0, 2 - int(np.log10(scaled)))}f}{suffix}"
+
+
+def markdown_table(header: list[str], rows: list[list[str]]) -> str:
+    lines = ["| " + " | ".join(header) + " |", "|" + "|".join("-" * (len(h) + 2) for h in header) + "|"]
+    lines += ["| " + " | ".join(row) + " |" for row in rows]
+    return "\n".join(lines)
+
+
+def render_tables(report: dict) -> dict[str, str]:
+    """Markdown table per section key of SECTIONS."""
+    symbols, t, s = report["symbols"], report["by_token"], report["by_size"]
+
+    def loan_cells(stats, i, unit):
+        return [f"{stats['count'][i]:,}", unit(format_amount(stats["total"][i])),
+                unit(format_amount(stats["avg"][i])), unit(format_amount(stats["median"][i])),
+                f"{stats['avg_gas'][i]:,.0f}", f"{int(stats['min_gas'][i]):,}"]
+
+    dollars = lambda text: "$" + text
+    columns = ["Events", "Total Volume", "Avg Loan", "Median Loan", "Avg Gas", "Min Gas"]
+    tables = {
+        "stablecoins": markdown_table(["Token"] + columns,
+                                      [[symbols[i]] + loan_cells(t, i, dollars) for i in report["stable_tokens"]]),
+    }
+    eth = report["eth_token"]
+    if eth is not None and t["count"][eth]:
+        tables["weth"] = markdown_table(columns, [loan_cells(t, eth, lambda text: f"{text} ETH")])
+    total = max(report["stable_loans"], 1)
+    tables["sizes"] = markdown_table(
+        ["Range", "Count", "Percentage"],
+        [[label, f"{s['count'][i]:,}", f"{100 * s['count'][i] / total:.1f}%"]
+         for i, label in enumerate(SIZE_LABELS)])
+    tables["gas"] = markdown_table(
+        ["Loan Size", "Events", "Avg Gas", "Min Gas"],
+        [[label, f"{s['count'][i]:,}", f"{s['avg_gas'][i]:,.0f}", f"{int(s['min_gas'][i]):,}"]
+         for i, label in enumerate(SIZE_LABELS) if s["count"][i]])
+    return tables
+
+
+def render_markdown(tables: dict[str, str]) -> str:
+    return "\n\n".join(f"{SECTIONS[key]}\n\n{table}" for key, table in tables.items()) + "\n"
+
+
+def update_document(text: str, tables: dict[str, str]) -> tuple[str, int]:
+    """Replace the first table under each section heading; returns the text and tables replaced."""
+    lines = text.split("\n")
+    replaced = 0
+    for key, table in tables.items():
+        if SECTIONS[key] not in lines:
+            continue
+        i = lines.index(SECTIONS[key]) + 1
+        while i < len(lines) and not lines[i].startswith("|"):
+            if lines[i].startswith("#"):
+                break
+            i += 1
+        if i == len(lines) or not lines[i].startswith("|"):
+            continue
+        end = i
+        while end < len(lines) and lines[end].startswith("|"):
+            end += 1
+        lines[i:end] = table.split("\n")
+        replaced += 1
+    return "\n".join(lines), replaced
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the BALANCER_COMPARISON.md statistics tables")
+    parser.add_argument("source", help="snapshot dir, Parquet dataset dir, .parquet file or CSV export")
+    parser.add_argument("-o", "--output", default=None, help="write the Markdown here instead of stdout")
+    parser.add_argument("--update", default=None, metavar="MD",
+                        help="replace the tables of an existing document (e.g. BALANCER_COMPARISON.md) in place")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    table = load_events(args.source)
+    t1 = time.perf_counter()
+    tables = render_tables(compute_report(table))
+    t2 = time.perf_counter()
+
+    if args.update:
+        with open(args.update) as f:
+            text, replaced = update_document(f.read(), tables)
+        with open(args.update, "w") as f:
+            f.write(text)
+        print(f"Updated {replaced} tables in {args.update}")
+    elif args.output:
+        with open(args.output, "w") as f:
+            f.write(render_markdown(tables))
+        print(f"Saved report to {args.output}")
+    else:
+        print(render_markdown(tables), end="")
+    if args.update or args.output:
+        print(f"{table.num_rows:,} events: loaded in {t1 - t0:.2f}s, computed in {t2 - t1:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
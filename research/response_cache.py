@@ -0,0 +1,192 @@
+"""
+Local Parquet cache of HyperSync FlashLoan responses.
+
+Responses are stored as Parquet segments of whole block ranges under
+  <root>/<contract>/<topic0>[-<filter digest>]/<lo>-<hi>.parquet
+with one row per log and the joined transaction's gas fields alongside it.
+A segment never crosses a fixed block window: a run that covers a window
+stores it as <start>-<end>, one that starts or stops inside it stores just
+the blocks it fetched. Later runs serve whatever stored segments cover and
+fetch (and store) only the gaps. Only blocks below the archive height are
+written, so a segment is always complete. Re-reading any range already
+fetched, sharded or not, needs no network.
+
+Requires: pip install hypersync pyarrow
+"""
+from __future__ import annotations
+import dataclasses
+import hashlib
+import json
+import os
+import re
+
+import hypersync
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from hypersync_stream import iter_pages
+from tx_store import TxJoinStore
+
+DEFAULT_WINDOW = 50_000
+SEGMENT_NAME = re.compile(r"(\d+)-(\d+)\.parquet")
+
+SEGMENT_SCHEMA = pa.schema([
+    ("block_number", pa.uint64()),
+    ("transaction_hash", pa.string()),
+    ("topic0", pa.string()),
+    ("topic1", pa.string()),
+    ("topic2", pa.string()),
+    ("data", pa.string()),
+    ("gas_used", pa.string()),
+    ("gas_price", pa.string()),
+])
+
+
+class CachedLog:
+    __slots__ = ("transaction_hash", "block_number", "topics", "data")
+
+    def __init__(self, transaction_hash, block_number, topics, data):
+        self.transaction_hash = transaction_hash
+        self.block_number = block_number
+        self.topics = topics
+        self.data = data
+
+
+class CachedTx:
+    __slots__ = ("hash", "gas_used", "gas_price")
+
+    def __init__(self, hash, gas_used, gas_price):
+        self.hash = hash
+        self.gas_used = gas_used
+        self.gas_price = gas_price
+
+
+class CachedPage:
+    """Stand-in for a hypersync QueryResponse served from the cache."""
+
+    class Data:
+        __slots__ = ("logs", "transactions")
+
+        def __init__(self, logs, transactions):
+            self.logs = logs
+            self.transactions = transactions
+
+    def __init__(self, next_block: int, archive_height: int, logs: list, transactions: list):
+        self.next_block = next_block
+        self.archive_height = archive_height
+        self.data = CachedPage.Data(logs, transactions)
+
+
+class ResponseCache:
+    """Parquet segments of one log selection, one file per block window."""
+
+    def __init__(self, root: str, query: hypersync.Query, window: int = DEFAULT_WINDOW):
+        selection = query.logs[0]
+        address = selection.address[0].lower()
+        topics = selection.topics or [[]]
+        key = topics[0][0] if topics[0] else "any"
+        if len(topics) > 1:
+            digest = hashlib.sha1(json.dumps(topics[1:]).encode()).hexdigest()[:10]
+            key = f"{key}-{digest}"
+        self.directory = os.path.join(root, address, key)
+        self.window = window
+        os.makedirs(self.directory, exist_ok=True)
+
+    def segment_path(self, lo: int, hi: int) -> str:
+        return os.path.join(self.directory, f"{lo}-{hi}.parquet")
+
+    def segments(self) -> list[tuple[int, int]]:
+        """Block ranges [lo, hi) of the stored segments."""
+        names = (SEGMENT_NAME.fullmatch(name) for name in os.listdir(self.directory))
+        return sorted((int(m.group(1)), int(m.group(2))) for m in names if m)
+
+    def read(self, segment: tuple[int, int], lo: int, hi: int) -> tuple[list, list]:
+        """Logs in [lo, hi) and their transactions from one cached segment."""
+        columns = pq.read_table(self.segment_path(*segment)).to_pydict()
+        logs = []
+        txs = {}
+        for block, tx_hash, t0, t1, t2, data, gas_used, gas_price in zip(
+            columns["block_number"], columns["transaction_hash"],
+            columns["topic0"], columns["topic1"], columns["topic2"],
+            columns["data"], columns["gas_used"], columns["gas_price"],
+        ):
+            if not lo <= block < hi:
+                continue
+            topics = [t0, t1, t2]
+            while topics and topics[-1] is None:
+                topics.pop()
+            logs.append(CachedLog(tx_hash, block, topics, data))
+            if tx_hash not in txs and (gas_used is not None or gas_price is not None):
+                txs[tx_hash] = CachedTx(tx_hash, gas_used, gas_price)
+        return logs, list(txs.values())
+
+    def write(self, lo: int, hi: int, logs: list, txs: TxJoinStore):
+        """Store the complete logs of blocks [lo, hi) atomically."""
+        columns = {name: [] for name in SEGMENT_SCHEMA.names}
+        for log in logs:
+            topics = list(log.topics or [])[:3]
+            topics += [None] * (3 - len(topics))
+            gas = txs.get(log.transaction_hash)
+            columns["block_number"].append(log.block_number)
+            columns["transaction_hash"].append(log.transaction_hash)
+            columns["topic0"].append(topics[0])
+            columns["topic1"].append(topics[1])
+            columns["topic2"].append(topics[2])
+            columns["data"].append(log.data)
+            columns["gas_used"].append(hex(gas[0]) if gas else None)
+            columns["gas_price"].append(hex(gas[1]) if gas else None)
+        table = pa.Table.from_pydict(columns, schema=SEGMENT_SCHEMA)
+        path = self.segment_path(lo, hi)
+        pq.write_table(table, path + ".tmp", compression="zstd")
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def pieces(segments: list, lo: int, hi: int) -> list[tuple[int, int, tuple | None]]:
+        """[lo, hi) split into runs served by one stored segment and gaps (segment None)."""
+        pieces = []
+        block = lo
+        while block < hi:
+            covering = [seg for seg in segments if seg[0] <= block < seg[1]]
+            if covering:
+                segment = max(covering, key=lambda seg: seg[1])
+                end = min(segment[1], hi)
+            else:
+                segment = None
+                end = min([seg[0] for seg in segments if block < seg[0] < hi] + [hi])
+            pieces.append((block, end, segment))
+            block = end
+        return pieces
+
+    async def pages(self, client, query: hypersync.Query, to_block: int | None, limiter=None):
+        """Yield pages for [query.from_block, to_block), fetching only uncached blocks."""
+        from_block = query.from_block
+        if to_block is None:
+            to_block = await client.get_height()
+        height = None
+        segments = self.segments()
+
+        for start in range(from_block - from_block % self.window, to_block, self.window):
+            lo, hi = max(start, from_block), min(start + self.window, to_block)
+            for a, b, segment in self.pieces(segments, lo, hi):
+                if segment is not None:
+                    logs, txs = self.read(segment, a, b)
+                    yield CachedPage(b, to_block, logs, txs)
+                    continue
+
+                if height is None:
+                    height = await client.get_height()
+                gap_query = dataclasses.replace(query, from_block=a, to_block=b)
+                if b > height:
+                    # blocks past the archive height may still change
+                    async for res in iter_pages(client, gap_query, b, limiter):
+                        yield res
+                    continue
+
+                gap_logs = []
+                gap_txs = TxJoinStore()
+                async for res in iter_pages(client, gap_query, b, limiter):
+                    gap_logs.extend(res.data.logs or [])
+                    gap_txs.add_all(res.data.transactions)
+                    yield res
+                self.write(a, b, gap_logs, gap_txs)
+                segments.append((a, b))
@@ -0,0 +1,266 @@
+"""
+Materialized per-block-window rollups of decoded FlashLoan events.
+
+Each fixed block window gets one small JSON file of mergeable aggregates:
+per-token moments of the loan amount and gas (aggregate.Aggregator) and
+their KLL quantile sketches (quantiles.GroupedQuantiles), plus the block
+range the window's aggregates actually cover:
+
+  <dir>/rollup.json          window size and sketch k
+  <dir>/19000000.json        window [19000000, 19100000)
+  ...
+
+The extractor keeps them next to its output with --rollups (inside a
+--parquet-dir as _rollups/, otherwise as <output>.rollups/). A run only
+rewrites the windows it touches. A partial window is extended when a later
+run continues exactly where the earlier one stopped, and replaced when a
+run covers all of it; otherwise the stored window is kept. Range questions
+then merge a few precomputed windows instead of scanning events:
+
+  python rollups.py flashloans_parquet/_rollups series --token USDC
+  python rollups.py flashloans_parquet/_rollups total --from-block 20000000 --to-block 21000000
+
+Ranges are answered in whole windows; the covered range is printed. Events
+carry no timestamps yet, so there are no per-day rollups; on post-merge
+blocks a 7200-block window is close to a day.
+
+Requires: pip install numpy pyarrow
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+
+from aggregate import Aggregator
+from event_store import print_rows
+from parquet_sink import DEFAULT_WINDOW
+from quantiles import DEFAULT_K, GroupedQuantiles
+
+META_FILE = "rollup.json"
+
+
+class WindowRollup:
+    """Mergeable aggregates of one block window and the blocks they cover."""
+
+    def __init__(self, start: int, from_block: int, to_block: int, k: int = DEFAULT_K):
+        self.start = start
+        self.from_block = from_block
+        self.to_block = to_block
+        self.stats = Aggregator(["token"])
+        self.quantiles = GroupedQuantiles(["token"], k)
+
+    def add_table(self, table: pa.Table | None):
+        self.stats.add_table(table)
+        self.quantiles.add_table(table)
+
+    def merge(self, other: WindowRollup):
+        """Fold in the aggregates of another block range (same or another window)."""
+        self.stats.merge(other.stats)
+        self.quantiles.merge(other.quantiles)
+        self.from_block = min(self.from_block, other.from_block)
+        self.to_block = max(self.to_block, other.to_block)
+
+    def to_dict(self) -> dict:
+        return {"start": self.start, "from_block": self.from_block, "to_block": self.to_block,
+                "stats": self.stats.to_dict(), "quantiles": self.quantiles.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> WindowRollup:
+        rollup = cls(d["start"], d["from_block"], d["to_block"])
+        rollup.stats = Aggregator.from_dict(d["stats"])
+        rollup.quantiles = GroupedQuantiles.from_dict(d["quantiles"])
+        return rollup
+
+
+def rollup_meta(root: str) -> dict | None:
+    """Window size and sketch k of the rollups under root, None if there are none."""
+    path = os.path.join(root, META_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def rollup_window(root: str) -> int | None:
+    """Window size of the rollups under root, None if there are none."""
+    meta = rollup_meta(root)
+    return meta["window"] if meta is not None else None
+
+
+def check_rollups(root: str, window: int, k: int):
+    """Raise ValueError if the rollups under root use another window size or sketch k."""
+    meta = rollup_meta(root)
+    if meta is None:
+        return
+    if meta["window"] != window:
+        raise ValueError(f"{root} holds {meta['window']}-block rollups, not {window}")
+    if meta["k"] != k:
+        raise ValueError(f"{root} holds quantile sketches with k={meta['k']}, not {k} "
+                         f"(use the --quantile-error of the run that created it)")
+
+
+class RollupWriter:
+    """Folds consecutive pages of events into the per-window rollups under root.
+
+    Call start(from_block), then load_page(table, next_block) per page in
+    block order, then close(). A window's file is written once the pages
+    have moved past it; the last, partial window on close().
+    """
+
+    def __init__(self, root: str, window: int = DEFAULT_WINDOW, k: int = DEFAULT_K):
+        check_rollups(root, window, k)
+        os.makedirs(root, exist_ok=True)
+        with open(os.path.join(root, META_FILE), "w") as f:
+            json.dump({"window": window, "k": k}, f)
+        self.root = root
+        self.window = window
+        self.k = k
+        self.pending: dict[int, WindowRollup] = {}
+        self.next_block: int | None = None
+        self.written = 0
+
+    def start(self, from_block: int):
+        self.next_block = from_block
+
+    def load_page(self, table: pa.Table | None, next_block: int):
+        """Add the events of blocks [previous next_block, next_block)."""
+        first, last = self.next_block // self.window, (next_block - 1) // self.window
+        for w in range(first, last + 1):
+            start = w * self.window
+            lo, hi = max(self.next_block, start), min(next_block, start + self.window)
+            if start in self.pending:
+                self.pending[start].to_block = hi
+            else:
+                self.pending[start] = WindowRollup(start, lo, hi, self.k)
+        if table is not None and table.num_rows:
+            windows = table.column("block").to_numpy() // self.window
+            present = np.unique(windows).tolist()
+            for w in present:
+                part = table if len(present) == 1 else table.filter(pa.array(windows == w))
+                self.pending[w * self.window].add_table(part)
+        self.next_block = next_block
+        for start in [s for s in self.pending if s + self.window <= next_block]:
+            self._save(self.pending.pop(start))
+
+    def _save(self, rollup: WindowRollup):
+        path = os.path.join(self.root, f"{rollup.start}.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                existing = WindowRollup.from_dict(json.load(f))
+            if existing.to_block == rollup.from_block or rollup.to_block == existing.from_block:
+                existing.merge(rollup)
+                rollup = existing
+            elif not (rollup.from_block <= existing.from_block and existing.to_block <= rollup.to_block):
+                # one range per window: never trade stored blocks for fewer
+                if not (existing.from_block <= rollup.from_block and rollup.to_block <= existing.to_block):
+                    print(f"  Rollup window {rollup.start:,}: kept blocks {existing.from_block:,}-"
+                          f"{existing.to_block:,}, this run's {rollup.from_block:,}-{rollup.to_block:,} "
+                          f"neither extend nor cover them and are not rolled up")
+                return
+        with open(path + ".tmp", "w") as f:
+            json.dump(rollup.to_dict(), f)
+        os.replace(path + ".tmp", path)
+        self.written += 1
+
+    def close(self):
+        for start in sorted(self.pending):
+            self._save(self.pending.pop(start))
+
+
+def write_rollups(table: pa.Table | None, root: str, from_block: int, to_block: int,
+                  window: int = DEFAULT_WINDOW, k: int = DEFAULT_K) -> int:
+    """Roll up a whole event table covering [from_block, to_block); returns windows written."""
+    writer = RollupWriter(root, window, k)
+    writer.start(from_block)
+    writer.load_page(table, to_block)
+    writer.close()
+    return writer.written
+
+
+class Rollups:
+    """Read side of a rollup directory."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.window = rollup_window(root)
+        if self.window is None:
+            raise FileNotFoundError(f"{root} has no {META_FILE} (not a rollup directory)")
+        self.starts = sorted(int(name[:-5]) for name in os.listdir(root)
+                             if name.endswith(".json") and name[:-5].isdigit())
+
+    def load(self, start: int) -> WindowRollup:
+        with open(os.path.join(self.root, f"{start}.json")) as f:
+            return WindowRollup.from_dict(json.load(f))
+
+    def windows(self, from_block: int | None = None, to_block: int | None = None) -> list[WindowRollup]:
+        """Rollups of the windows overlapping [from_block, to_block), in block order."""
+        return [self.load(start) for start in self.starts
+                if (from_block is None or start + self.window > from_block)
+                and (to_block is None or start < to_block)]
+
+    def total(self, from_block: int | None = None, to_block: int | None = None) -> tuple[WindowRollup, list]:
+        """Windows overlapping the range merged into one, and the gaps [from, to) in its coverage."""
+        windows = self.windows(from_block, to_block)
+        if not windows:
+            return WindowRollup(from_block or 0, from_block or 0, from_block or 0), []
+        combined = WindowRollup(windows[0].start, windows[0].from_block, windows[0].from_block)
+        gaps = []
+        for rollup in windows:
+            if rollup.from_block > combined.to_block:
+                gaps.append((combined.to_block, rollup.from_block))
+            combined.merge(rollup)
+        return combined, gaps
+
+
+def series_rows(rollups: Rollups, tokens, from_block, to_block) -> list[tuple]:
+    rows = []
+    for rollup in rollups.windows(from_block, to_block):
+        for token, s in rollup.stats.items():
+            if tokens and token not in tokens:
+                continue
+            q = rollup.quantiles.groups[token]
+            rows.append((rollup.start, token, s.count, s.amount.sum, s.amount.avg,
+                         q.amount.quantile(0.5), s.gas.avg if s.gas.count else None,
+                         q.gas.quantile(0.5) if q.gas.n else None))
+    return rows
+
+
+def total_rows(rollup: WindowRollup, tokens) -> list[tuple]:
+    rows = []
+    for token, s in rollup.stats.items():
+        if tokens and token not in tokens:
+            continue
+        q = rollup.quantiles.groups[token]
+        gas = q.gas.quantiles([0.5, 0.9]) if q.gas.n else [None, None]
+        rows.append((token, s.count, s.amount.sum, s.amount.avg, s.amount.std, q.amount.quantile(0.5),
+                     s.gas.avg if s.gas.count else None, *gas))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query per-block-window FlashLoan rollups")
+    parser.add_argument("root")
+    parser.add_argument("command", choices=["series", "total"],
+                        help="series: one row per window and token; total: the range merged per token")
+    parser.add_argument("--token", action="append", default=None, help="token symbol (repeatable)")
+    parser.add_argument("--from-block", type=int, default=None)
+    parser.add_argument("--to-block", type=int, default=None, help="exclusive")
+    args = parser.parse_args()
+
+    rollups = Rollups(args.root)
+    if args.command == "series":
+        names = ["window", "token", "loans", "volume", "avg_loan", "median_loan", "avg_gas", "median_gas"]
+        print_rows(names, series_rows(rollups, args.token, args.from_block, args.to_block))
+        return
+    combined, gaps = rollups.total(args.from_block, args.to_block)
+    names = ["token", "loans", "volume", "avg_loan", "std_loan", "median_loan", "avg_gas", "median_gas", "p90_gas"]
+    print_rows(names, total_rows(combined, args.token))
+    print(f"(blocks {combined.from_block:,}-{combined.to_block:,}, {rollups.window:,}-block windows"
+          + (f"; not covered: {', '.join(f'{a:,}-{b:,}' for a, b in gaps)}" if gaps else "") + ")")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Rate-limit-aware request scheduler for the HyperSync client.
+
+Wraps a HypersyncClient with
+  - a token bucket capping the request rate,
+  - a per-request timeout,
+  - exponential backoff with jitter on 429 / 5xx / timeouts / dropped connections
+    (by the error's status code or type; message text only when it names them),
+  - AIMD concurrency and rate: every success nudges both up, every throttle or
+    transient error halves them, so the scheduler settles just under the
+    limit the server is actually enforcing.
+
+The wrapper exposes the client methods the research scripts use (get,
+get_arrow, get_height), so it can be passed anywhere a client is expected.
+"""
+from __future__ import annotations
+import asyncio
+import random
+import re
+import time
+
+from metrics import RunMetrics
+
+# (max requests/s, burst, max concurrent requests)
+UNAUTHENTICATED_LIMITS = (5.0, 5, 4)
+AUTHENTICATED_LIMITS = (50.0, 20, 32)
+
+REQUEST_TIMEOUT = 60.0
+MAX_RETRIES = 8
+BASE_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+DECREASE_INTERVAL = 1.0
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# Only an explicit "HTTP 503" / "status 429" / "status code: 500" counts as a
+# status in an error message, never a bare number (e.g. "invalid block 512").
+_STATUS = re.compile(r"\b(?:http|status)(?:[ _]?code)?\s*[:=]?\s*(\d{3})\b", re.IGNORECASE)
+_TRANSIENT = re.compile(
+    r"too many requests|rate.?limit|timed out|connection (?:reset|refused|closed|aborted)|broken pipe|"
+    r"error sending request|temporarily unavailable|service unavailable|bad gateway|gateway time-?out|overloaded",
+    re.IGNORECASE,
+)
+_THROTTLED = re.compile(r"too many requests|rate.?limit", re.IGNORECASE)
+
+
+def status_code(err: BaseException) -> int | None:
+    """HTTP status of a failed request: a status / status_code attribute, else one named in the message."""
+    for obj in (err, getattr(err, "response", None)):
+        for name in ("status", "status_code"):
+            value = getattr(obj, name, None)
+            if isinstance(value, int):
+                return value
+    match = _STATUS.search(str(err))
+    return int(match.group(1)) if match else None
+
+
+def is_retryable(err: BaseException) -> bool:
+    """Throttling, server errors, timeouts and connection drops are worth retrying."""
+    if isinstance(err, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = status_code(err)
+    if status is not None:
+        return status in RETRY_STATUSES
+    return bool(_TRANSIENT.search(str(err)))
+
+
+def is_throttled(err: BaseException) -> bool:
+    status = status_code(err)
+    if status is not None:
+        return status == 429
+    return bool(_THROTTLED.search(str(err)))
+
+
+class TokenBucket:
+    """Classic token bucket; acquire() waits until a token is available."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RequestScheduler:
+    """Token-bucketed, retrying, adaptively concurrent HyperSync client wrapper."""
+
+    def __init__(
+        self,
+        client,
+        rate: float,
+        burst: int,
+        max_concurrency: int,
+        timeout: float = REQUEST_TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+        metrics: RunMetrics | None = None,
+    ):
+        self.client = client
+        self.metrics = metrics
+        self.max_rate = rate
+        self.min_rate = max(rate / 50, 0.1)
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max_concurrency)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.error_rate = 0.0
+        self._slots = asyncio.Condition()
+        self._last_decrease = 0.0
+
+    async def get(self, query):
+        return await self._query(self.client.get, query)
+
+    async def get_arrow(self, query):
+        return await self._query(self.client.get_arrow, query)
+
+    async def get_height(self) -> int:
+        res, _ = await self._call(self.client.get_height)
+        return res
+
+    async def _query(self, fn, query):
+        from_block = query.from_block
+        res, seconds = await self._call(fn, query)
+        if self.metrics is not None:
+            self.metrics.record_request(seconds, from_block, res)
+        return res
+
+    async def _acquire_slot(self):
+        async with self._slots:
+            await self._slots.wait_for(lambda: self.in_flight < max(1, int(self.concurrency)))
+            self.in_flight += 1
+
+    async def _release_slot(self):
+        async with self._slots:
+            self.in_flight -= 1
+            self._slots.notify_all()
+
+    def _on_success(self):
+        self.error_rate *= 0.95
+        self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+        self.bucket.rate = min(self.max_rate, self.bucket.rate + self.max_rate / 100)
+
+    def _on_error(self, throttled: bool):
+        self.error_rate = self.error_rate * 0.95 + 0.05
+        if throttled:
+            self.throttled += 1
+        # A burst of failures from one overload counts as a single decrease.
+        now = time.monotonic()
+        if now - self._last_decrease < DECREASE_INTERVAL:
+            return
+        self._last_decrease = now
+        self.concurrency = max(1.0, self.concurrency / 2)
+        if throttled:
+            self.bucket.rate = max(self.min_rate, self.bucket.rate / 2)
+
+    async def _call(self, fn, *args):
+        """Call fn with retries, returns (result, latency of the successful attempt)."""
+        for attempt in range(self.max_retries + 1):
+            await self._acquire_slot()
+            try:
+                await self.bucket.acquire()
+                self.requests += 1
+                start = time.perf_counter()
+                res = await asyncio.wait_for(fn(*args), self.timeout)
+            except Exception as err:
+                if not is_retryable(err) or attempt == self.max_retries:
+                    raise
+                self._on_error(is_throttled(err))
+                self.retries += 1
+                if self.metrics is not None:
+                    self.metrics.record_retry()
+                delay = random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
+                print(f"  [retry {attempt + 1}/{self.max_retries}] {type(err).__name__}: {str(err)[:80]} "
+                      f"| backoff {delay:.1f}s, concurrency {int(self.concurrency)}, "
+                      f"rate {self.bucket.rate:.1f}/s, error rate {self.error_rate:.0%}")
+            else:
+                self._on_success()
+                return res, time.perf_counter() - start
+            finally:
+                await self._release_slot()
+            await asyncio.sleep(delay)
+
+    def report(self) -> str:
+        return (f"{self.requests} requests, {self.retries} retries ({self.throttled} throttled), "
+                f"concurrency {int(self.concurrency)}/{self.max_concurrency}, "
+                f"rate {self.bucket.rate:.1f}/{self.max_rate:.0f} req/s")
+
+
+def schedule(client, authenticated: bool, metrics: RunMetrics | None = None) -> RequestScheduler:
+    """Wrap a client with the limits of its access tier."""
+    rate, burst, concurrency = AUTHENTICATED_LIMITS if authenticated else UNAUTHENTICATED_LIMITS
+    return RequestScheduler(client, rate, burst, concurrency, metrics=metrics)
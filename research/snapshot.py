@@ -0,0 +1,188 @@
+"""
+Memory-mapped columnar snapshot of decoded FlashLoan events.
+
+A snapshot is a directory of raw fixed-width column files plus a manifest:
+
+  <dir>/manifest.json     row count, column dtypes / widths, token symbols
+  <dir>/block.bin         uint64, one per event
+  <dir>/tx_hash.bin       32 bytes per event
+  ...
+
+Opening a snapshot only reads the manifest and maps the files with
+numpy.memmap, so it is instant regardless of size and memory is used only
+for the pages a query actually touches. The token column holds uint16 ids
+into the manifest's symbol list. Nullable columns (the recipient) have a
+<name>.valid.bin file of one byte per event next to them, 0 where the value
+is missing. The manifest is written last (atomically),
+so a directory without one is an incomplete snapshot.
+
+Usage:
+  snap = Snapshot("flashloans_snapshot")
+  usdc = snap["token"] == snap.token_id("USDC")
+  snap["amount"][usdc].sum()
+
+Requires: pip install numpy pyarrow
+"""
+from __future__ import annotations
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+
+from columnar import fixed_binary_array, fixed_matrix, valid_mask
+from events import CSV_FIELDS
+
+VERSION = 1
+MANIFEST = "manifest.json"
+
+# name -> (dtype, bytes per row for fixed-width binary columns)
+COLUMNS = {
+    "tx_hash": ("u1", 32),
+    "block": ("<u8", None),
+    "token": ("<u2", None),
+    "token_address": ("u1", 20),
+    "amount_raw": ("u1", 32),
+    "amount": ("<f8", None),
+    "decimals": ("u1", None),
+    "fee_raw": ("u1", 32),
+    "gas_used": ("<u8", None),
+    "gas_price_gwei": ("<f8", None),
+    "recipient": ("u1", 20),
+}
+assert list(COLUMNS) == CSV_FIELDS
+
+# columns that can be null, with a validity file next to the values
+NULLABLE = {"recipient"}
+
+
+class SnapshotWriter:
+    """Appends event tables to a snapshot directory; close() publishes the manifest."""
+
+    def __init__(self, path: str, meta: dict | None = None):
+        self.path = path
+        self.meta = meta or {}
+        self.rows = 0
+        self.symbols: list[str] = []
+        self.ids: dict[str, int] = {}
+        os.makedirs(path, exist_ok=True)
+        manifest = os.path.join(path, MANIFEST)
+        if os.path.exists(manifest):
+            os.remove(manifest)
+        self.files = {name: open(os.path.join(path, f"{name}.bin"), "wb") for name in COLUMNS}
+        self.valid_files = {name: open(os.path.join(path, f"{name}.valid.bin"), "wb") for name in NULLABLE}
+
+    def _token_ids(self, arr) -> np.ndarray:
+        """Map a dictionary column onto this snapshot's symbol list."""
+        if isinstance(arr, pa.ChunkedArray):
+            arr = arr.combine_chunks()
+        remap = np.empty(len(arr.dictionary), dtype=np.uint16)
+        for i, symbol in enumerate(arr.dictionary.to_pylist()):
+            if symbol not in self.ids:
+                self.ids[symbol] = len(self.symbols)
+                self.symbols.append(symbol)
+            remap[i] = self.ids[symbol]
+        return remap[arr.indices.to_numpy(zero_copy_only=False)]
+
+    def write(self, table: pa.Table | None):
+        """Append a decoded table (columns as decode_flashloan_table)."""
+        if table is None or table.num_rows == 0:
+            return
+        for name, (dtype, width) in COLUMNS.items():
+            column = table.column(name)
+            if name == "token":
+                values = self._token_ids(column)
+            elif width:
+                values = fixed_matrix(column)
+            else:
+                values = column.to_numpy().astype(dtype, copy=False)
+            self.files[name].write(np.ascontiguousarray(values).data)
+            if name in NULLABLE:
+                self.valid_files[name].write(valid_mask(column).astype(np.uint8).data)
+        self.rows += table.num_rows
+
+    def close(self):
+        for f in [*self.files.values(), *self.valid_files.values()]:
+            f.close()
+        manifest = {
+            "version": VERSION,
+            "rows": self.rows,
+            "columns": {name: {"file": f"{name}.bin", "dtype": dtype, "width": width,
+                               **({"valid": f"{name}.valid.bin"} if name in NULLABLE else {})}
+                        for name, (dtype, width) in COLUMNS.items()},
+            "tokens": self.symbols,
+            **self.meta,
+        }
+        path = os.path.join(self.path, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(path + ".tmp", path)
+
+    def __enter__(self) -> SnapshotWriter:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_snapshot(table: pa.Table, path: str, meta: dict | None = None) -> int:
+    """Write a whole event table as a snapshot, returns the row count."""
+    with SnapshotWriter(path, meta) as writer:
+        writer.write(table)
+    return writer.rows
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of a snapshot directory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        manifest = os.path.join(path, MANIFEST)
+        if not os.path.exists(manifest):
+            raise FileNotFoundError(f"{path} has no {MANIFEST} (not a snapshot, or never completed)")
+        with open(manifest) as f:
+            self.manifest = json.load(f)
+        if self.manifest["version"] != VERSION:
+            raise ValueError(f"{path} is snapshot version {self.manifest['version']}, expected {VERSION}")
+        self.rows: int = self.manifest["rows"]
+        self.tokens: list[str] = self.manifest["tokens"]
+        self._columns: dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Column as a read-only memmap; (rows, width) uint8 for binary columns."""
+        if name not in self._columns:
+            spec = self.manifest["columns"][name]
+            shape = (self.rows, spec["width"]) if spec["width"] else (self.rows,)
+            if self.rows == 0:
+                self._columns[name] = np.empty(shape, dtype=spec["dtype"])
+            else:
+                self._columns[name] = np.memmap(os.path.join(self.path, spec["file"]),
+                                                dtype=spec["dtype"], mode="r", shape=shape)
+        return self._columns[name]
+
+    def valid(self, name: str) -> np.ndarray | None:
+        """Boolean mask of the rows where a nullable column has a value, None for other columns."""
+        spec = self.manifest["columns"][name]
+        if "valid" not in spec or self.rows == 0:
+            return None
+        return np.memmap(os.path.join(self.path, spec["valid"]), dtype=np.bool_, mode="r", shape=(self.rows,))
+
+    def token_id(self, symbol: str) -> int:
+        """Id of a symbol in the token column, -1 if it never occurs."""
+        return self.tokens.index(symbol) if symbol in self.tokens else -1
+
+    def table(self, columns: list[str] | None = None) -> pa.Table:
+        """Arrow table over the mapped columns (no copies), token as a categorical."""
+        arrays = {}
+        for name in columns or CSV_FIELDS:
+            values = self[name]
+            if name == "token":
+                arrays[name] = pa.DictionaryArray.from_arrays(pa.array(values), pa.array(self.tokens, pa.string()))
+            elif values.ndim == 2:
+                arrays[name] = fixed_binary_array(values, self.valid(name))
+            else:
+                arrays[name] = pa.array(values)
+        return pa.table(arrays)
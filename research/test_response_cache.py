@@ -0,0 +1,76 @@
+"""
+Re-running cached ranges must not touch the network, however they are split.
+
+  python -m pytest research/test_response_cache.py
+
+Requires: pip install hypersync numpy pyarrow pytest
+"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import types
+
+import pytest
+
+import extract_all_flashloans as extractor
+
+TOKEN = "0x000000000000000000000000a0b86991c6218b36c1d19d4a2e9eb0ce3606eb48"
+RECIPIENT = "0x000000000000000000000000" + "ab" * 20
+HEIGHT = 19_300_000
+
+
+class FakeClient:
+    """Serves a synthetic FlashLoan every 7 blocks, 20k blocks per page."""
+
+    def __init__(self, offline: bool = False):
+        self.offline = offline
+        self.calls = 0
+
+    async def get_height(self) -> int:
+        self._call()
+        return HEIGHT
+
+    async def get(self, query):
+        self._call()
+        lo = query.from_block
+        hi = min(lo + 20_000, query.to_block or HEIGHT, HEIGHT)
+        first = lo + (-lo) % 7
+        logs = [types.SimpleNamespace(
+            transaction_hash="0x" + hashlib.sha256(str(b).encode()).hexdigest(), block_number=b,
+            topics=[extractor.FLASHLOAN_TOPIC, RECIPIENT, TOKEN],
+            data="0x" + format(b * 10**6, "064x") + format(b % 1000, "064x"),
+        ) for b in range(first, hi, 7)]
+        txs = [types.SimpleNamespace(hash=log.transaction_hash, gas_used=hex(100_000 + log.block_number % 5000),
+                                     gas_price=hex(10**9)) for log in logs]
+        return types.SimpleNamespace(next_block=hi, archive_height=HEIGHT,
+                                     data=types.SimpleNamespace(logs=logs, transactions=txs))
+
+    def _call(self):
+        self.calls += 1
+        if self.offline:
+            raise AssertionError("network call on a cached range")
+
+
+def extract(monkeypatch, client, from_block, to_block, shards, cache_dir):
+    monkeypatch.setattr(extractor, "make_client", lambda metrics=None: client)
+    return asyncio.run(extractor.extract_flashloans(from_block, to_block, shards=shards, cache_dir=str(cache_dir)))
+
+
+@pytest.mark.parametrize("from_block, to_block, shards", [
+    (19_000_000, 19_300_000, 4),   # shard boundaries inside windows
+    (19_012_345, 19_187_654, 3),   # unaligned ends
+    (19_012_345, 19_187_654, 1),
+])
+def test_rerun_needs_no_network(monkeypatch, tmp_path, from_block, to_block, shards):
+    expected = extract(monkeypatch, FakeClient(), from_block, to_block, shards, tmp_path)
+    again = extract(monkeypatch, FakeClient(offline=True), from_block, to_block, shards, tmp_path)
+    assert again.equals(expected)
+
+
+def test_split_runs_fill_the_cache(monkeypatch, tmp_path):
+    expected = extract(monkeypatch, FakeClient(), 19_010_000, 19_260_000, 1, tmp_path / "reference")
+    extract(monkeypatch, FakeClient(), 19_010_000, 19_130_000, 4, tmp_path / "cache")
+    extract(monkeypatch, FakeClient(), 19_130_000, 19_260_000, 3, tmp_path / "cache")
+    for shards in (1, 5):
+        again = extract(monkeypatch, FakeClient(offline=True), 19_010_000, 19_260_000, shards, tmp_path / "cache")
+        assert again.column("tx_hash").equals(expected.column("tx_hash"))
@@ -0,0 +1,121 @@
+"""
+Shared token registry for the FlashLoan research scripts.
+
+Every token gets a small integer id (uint16) indexing parallel arrays of
+symbol, decimals and class, so a decoded token column is just ids and the
+decimals of a whole page are one NumPy gather. Lookups are keyed by the
+20-byte address, taken straight from a raw (or hex) padded topic; a page of
+topics is dictionary-encoded first so each distinct token is resolved once.
+Tokens not in TOKENS are registered on first sight with 18 decimals.
+
+Requires: pip install numpy pyarrow
+"""
+from __future__ import annotations
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# STABLECOIN is US-dollar pegged only, so its amounts sum as dollars;
+# stablecoins of other currencies get a class of their own
+OTHER, STABLECOIN, ETH, BTC, EUR_STABLECOIN = 0, 1, 2, 3, 4
+CLASS_NAMES = ("other", "stablecoin", "eth", "btc", "eur_stablecoin")
+
+# (address, symbol, decimals, class)
+TOKENS = [
+    ("0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48", "USDC", 6, STABLECOIN),
+    ("0xdac17f958d2ee523a2206206994597c13d831ec7", "USDT", 6, STABLECOIN),
+    ("0x6b175474e89094c44da98b954eedeac495271d0f", "DAI", 18, STABLECOIN),
+    ("0x853d955acef822db058eb8505911ed77f175b99e", "FRAX", 18, STABLECOIN),
+    ("0x5f98805a4e8be255a32880fdec7f6728c6568ba0", "LUSD", 18, STABLECOIN),
+    ("0x4fabb145d64652a948d72533023f6e7a623c7c53", "BUSD", 18, STABLECOIN),
+    ("0x8e870d67f660d95d5be530380d0ec0bd388289e1", "USDP", 18, STABLECOIN),
+    ("0x0000000000085d4780b73119b644ae5ecd22b376", "TUSD", 18, STABLECOIN),
+    ("0x57ab1ec28d129707052df4df418d58a2d46d5f51", "sUSD", 18, STABLECOIN),
+    ("0x1abaea1f7c830bd89acc67ec4af516284b1bc33c", "EURC", 6, EUR_STABLECOIN),
+    ("0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2", "WETH", 18, ETH),
+    ("0x2260fac5e5542a773aa44fbcfedf7c193bc2c599", "WBTC", 8, BTC),
+    ("0xcd5fe23c85820f7b72d0926fc9b05b43e359b7ee", "weETH", 18, ETH),
+    ("0x7f39c581f595b53c5cb19bd0b3f8da6c935e2ca0", "wstETH", 18, ETH),
+    ("0xae78736cd615f374d3085123a210448e74fc6393", "rETH", 18, ETH),
+    ("0xbe9895146f7af43049ca1c1ae358b0541ea49704", "cbETH", 18, ETH),
+    ("0xa35b1b31ce002fbf2058d22f30f95d405200a15b", "ETHx", 18, ETH),
+    ("0xac3e018457b222d93114458476f3e3416abbe38f", "sfrxETH", 18, ETH),
+]
+
+UNKNOWN = 0  # id of logs without a token topic
+MAX_TOKENS = 1 << 16
+
+
+def address_key(value) -> bytes | None:
+    """20-byte address of a hex or binary address / 32-byte padded topic."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value[-20:])
+
+
+class TokenRegistry:
+    """Token id -> address, symbol, decimals and class, and address -> id."""
+
+    def __init__(self, tokens=TOKENS):
+        self.ids: dict[bytes, int] = {}
+        self.addresses: list[bytes | None] = [None]
+        self.symbols: list[str] = ["Unknown"]
+        self.decimals = np.array([18], dtype=np.uint8)
+        self.classes = np.array([OTHER], dtype=np.uint8)
+        for address, symbol, decimals, cls in tokens:
+            self.register(address_key(address), symbol, decimals, cls)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def register(self, key: bytes, symbol: str, decimals: int = 18, cls: int = OTHER) -> int:
+        """Add a token by 20-byte address, returns its id."""
+        if len(self.symbols) >= MAX_TOKENS:
+            raise OverflowError("token registry is full (ids are uint16)")
+        token_id = len(self.symbols)
+        self.ids[key] = token_id
+        self.addresses.append(key)
+        self.symbols.append(symbol)
+        self.decimals = np.append(self.decimals, np.uint8(decimals))
+        self.classes = np.append(self.classes, np.uint8(cls))
+        return token_id
+
+    def lookup(self, topic) -> int:
+        """Id of the token in a topic or address (hex or bytes), registering unknown ones."""
+        key = address_key(topic)
+        if key is None:
+            return UNKNOWN
+        token_id = self.ids.get(key)
+        if token_id is None:
+            token_id = self.register(key, key[:8].hex() + "...")
+        return token_id
+
+    def lookup_many(self, topics) -> np.ndarray:
+        """uint16 ids of a page of topics (list or Arrow array), nulls as UNKNOWN."""
+        arr = topics if isinstance(topics, (pa.Array, pa.ChunkedArray)) else pa.array(topics)
+        if isinstance(arr, pa.ChunkedArray):
+            arr = arr.combine_chunks()
+        if pa.types.is_null(arr.type) or len(arr) == 0:
+            return np.zeros(len(arr), dtype=np.uint16)
+        encoded = pc.dictionary_encode(arr)
+        uniq = [self.lookup(value) for value in encoded.dictionary.to_pylist()]
+        uniq = np.array(uniq + [UNKNOWN], dtype=np.uint16)
+        index = pc.fill_null(encoded.indices, len(uniq) - 1).to_numpy(zero_copy_only=False)
+        return uniq[index]
+
+    def topic(self, token_id: int) -> str:
+        """32-byte padded hex topic of a token, as used in log filters."""
+        return "0x" + "00" * 12 + self.addresses[token_id].hex()
+
+    def of_class(self, cls: int) -> list[int]:
+        """Ids of every registered token of one class, in registry order."""
+        return [int(i) for i in np.flatnonzero(self.classes == cls)]
+
+    def dictionary(self, ids: np.ndarray) -> pa.DictionaryArray:
+        """Arrow categorical column of ids: uint16 indices into the symbols."""
+        return pa.DictionaryArray.from_arrays(pa.array(ids, pa.uint16()), pa.array(self.symbols))
+
+
+REGISTRY = TokenRegistry()
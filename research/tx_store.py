@@ -0,0 +1,83 @@
+"""
+Compact join store for the transaction side of FlashLoan queries.
+
+The decoders only need gas_used and gas_price of each joined transaction,
+so instead of keeping whole hypersync Transaction objects this keeps a
+32-byte binary hash -> row index dict and two array-backed uint64 columns.
+Hex / int quantities are normalized once on insert, not on every lookup.
+"""
+from __future__ import annotations
+from array import array
+
+
+def _quantity(value) -> int:
+    if not value:
+        return 0
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def hash_key(tx_hash) -> bytes:
+    """32-byte binary key of a hex (or already binary) transaction hash."""
+    return tx_hash if isinstance(tx_hash, bytes) else bytes.fromhex(tx_hash[2:])
+
+
+class TxJoinStore:
+    """gas_used / gas_price of joined transactions, keyed by binary hash."""
+
+    __slots__ = ("index", "gas_used", "gas_price")
+
+    def __init__(self):
+        self.index: dict[bytes, int] = {}
+        self.gas_used = array("Q")
+        self.gas_price = array("Q")
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, tx_hash) -> bool:
+        return hash_key(tx_hash) in self.index
+
+    def add(self, tx):
+        """Insert one hypersync (or cached) transaction, ignoring ones without a hash."""
+        if not getattr(tx, "hash", None):
+            return
+        self.put(hash_key(tx.hash), _quantity(getattr(tx, "gas_used", None)),
+                 _quantity(getattr(tx, "gas_price", None)))
+
+    def add_all(self, txs):
+        for tx in txs or []:
+            self.add(tx)
+
+    def add_all_hex(self, txs):
+        """add_all for transactions whose hash and gas fields are all hex strings."""
+        put = self.put
+        for tx in txs or []:
+            put(bytes.fromhex(tx.hash[2:]), int(tx.gas_used, 16), int(tx.gas_price, 16))
+
+    def add_all_int(self, txs):
+        """add_all for transactions with a hex hash and integer gas fields."""
+        put = self.put
+        for tx in txs or []:
+            put(bytes.fromhex(tx.hash[2:]), int(tx.gas_used), int(tx.gas_price))
+
+    def put(self, key: bytes, gas_used: int, gas_price: int):
+        i = self.index.get(key)
+        if i is None:
+            self.index[key] = len(self.gas_used)
+            self.gas_used.append(gas_used)
+            self.gas_price.append(gas_price)
+        else:
+            self.gas_used[i] = gas_used
+            self.gas_price[i] = gas_price
+
+    def update(self, other: TxJoinStore):
+        """Merge another store (e.g. from a different shard) into this one."""
+        for key, i in other.index.items():
+            self.put(key, other.gas_used[i], other.gas_price[i])
+
+    def get(self, tx_hash) -> tuple[int, int] | None:
+        """(gas_used, gas_price) of a transaction, or None if it was not joined."""
+        i = self.index.get(hash_key(tx_hash)) if tx_hash else None
+        if i is None:
+            return None
+        return self.gas_used[i], self.gas_price[i]